@@ -0,0 +1,171 @@
+from argparse import ArgumentParser
+from contextlib import redirect_stderr, redirect_stdout
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic_pbp import write_seasons
+from comeback_query import ComebackCounts, filter_comebacks
+from extract_comeback_data import (
+    GAMEINFO_COLS,
+    SCORE_COLS,
+    extract_season,
+    get_best_comebacks,
+    get_scoring_summaries,
+    get_season_comebacks,
+    get_season_file,
+    main,
+)
+from pbp_reader import concat_frames, read_play_by_play
+
+FIRST_YEAR = 1999
+SIZES = [1, 5, 25]
+DEFAULT_THRESHOLD = 0.25  # allowed relative slowdown before a stage counts as a regression
+APP_DEFICITS = range(17, 36)
+APP_GAME_TIMES = range(0, 3601, 300)
+APP_MAX_WPS = [None, 0.1, 0.2, 0.3]  # None: no WP cap
+
+def _quiet(fn, *args, **kwargs):
+    with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+        return fn(*args, **kwargs)
+
+def _scoring_summaries(df):
+    return df.groupby("game_id").apply(get_scoring_summaries).reset_index(drop=True)
+
+def _best_comebacks(df):
+    return df.groupby("game_id").apply(get_best_comebacks).reset_index(drop=True)
+
+def _app_queries(comebacks):
+    # the app's counts before ComebackCounts: one scan of the comeback rows per query
+    for deficit in APP_DEFICITS:
+        for game_time in APP_GAME_TIMES:
+            for include_postseason in [True, False]:
+                deficit_df = filter_comebacks(comebacks, deficit, game_time, include_postseason)
+                for max_wp in APP_MAX_WPS:
+                    wp_df = deficit_df if max_wp is None else deficit_df[deficit_df["score_team_wp_at_deficit"] <= max_wp]
+                    wp_df["game_id"].nunique()
+
+def _app_counts(counts):
+    # the same queries as the app answers them, one count_games call per slider state
+    for deficit in APP_DEFICITS:
+        for game_time in APP_GAME_TIMES:
+            for include_postseason in [True, False]:
+                for max_wp in APP_MAX_WPS:
+                    counts.count_games(deficit, game_time, include_postseason, max_wp=max_wp)
+
+def _app_counts_batch(counts):
+    deficits, game_times, max_wps = np.meshgrid(
+        np.asarray(APP_DEFICITS), np.asarray(APP_GAME_TIMES), np.array([np.nan if wp is None else wp for wp in APP_MAX_WPS]), indexing="ij",
+    )
+    for include_postseason in [True, False]:
+        counts.count_games_batch(deficits, game_times, include_postseason, max_wps=max_wps)
+
+def _extract(data_path, years):
+    main(data_path=data_path, begin_year=years[0], end_year=years[-1], force=True)
+
+def get_stages(data_path, years):
+    # stage name -> (callable, rows processed); inputs are prepared outside the timed region
+    columns = ["play_id", "game_id"] + GAMEINFO_COLS + SCORE_COLS
+    df = concat_frames([_quiet(read_play_by_play, get_season_file(data_path, year), columns)[0] for year in years])
+    filtered_df = df.loc[df["home_score"] != df["away_score"]]
+    comebacks = get_season_comebacks(filtered_df)
+    comeback_games = filtered_df[filtered_df["game_id"].isin(comebacks["game_id"])]
+    # extracted tables carry the season as `year`; game_ids start with it
+    query_comebacks = comebacks.assign(year=comebacks["game_id"].str[:4].astype(int))
+    counts = ComebackCounts(query_comebacks, APP_DEFICITS)
+    n_queries = len(APP_DEFICITS) * len(APP_GAME_TIMES) * len(APP_MAX_WPS) * 2
+    return {
+        "read_play_by_play": (lambda: [read_play_by_play(get_season_file(data_path, year), columns) for year in years], len(df)),
+        "get_best_comebacks": (lambda: _best_comebacks(filtered_df), len(filtered_df)),
+        "get_season_comebacks": (lambda: get_season_comebacks(filtered_df), len(filtered_df)),
+        "get_scoring_summaries": (lambda: _scoring_summaries(comeback_games), len(comeback_games)),
+        "extract_season": (lambda: extract_season(filtered_df), len(filtered_df)),
+        "main": (lambda: _extract(data_path, years), len(df)),
+        "app_filter": (lambda: _app_queries(comebacks), len(comebacks) * n_queries),
+        "app_counts_build": (lambda: ComebackCounts(query_comebacks, APP_DEFICITS), len(comebacks)),
+        "app_count_games": (lambda: _app_counts(counts), n_queries),
+        "app_count_games_batch": (lambda: _app_counts_batch(counts), n_queries),
+    }
+
+def time_stage(fn, rows, repeat=3, memory=True):
+    # best-of-`repeat` wall time; peak traced allocations come from one extra run so tracing does not skew timings
+    seconds = min(_timed(fn) for _ in range(repeat))
+    result = {"seconds": seconds, "rows": rows, "rows_per_second": rows / seconds if seconds > 0 else float("inf")}
+    if memory:
+        tracemalloc.start()
+        try:
+            _quiet(fn)
+            result["peak_mb"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        finally:
+            tracemalloc.stop()
+    return result
+
+def _timed(fn):
+    start = time.perf_counter()
+    _quiet(fn)
+    return time.perf_counter() - start
+
+def run(data_path, sizes=SIZES, stages=None, repeat=3, memory=True, seed=0):
+    years = list(range(FIRST_YEAR, FIRST_YEAR + max(sizes)))
+    missing = [year for year in years if not os.path.exists(get_season_file(data_path, year))]
+    if missing:
+        print("Generating", len(missing), "synthetic seasons in", data_path)
+        write_seasons(data_path, missing, seed=seed)
+
+    results = {}
+    for size in sizes:
+        for name, (fn, rows) in get_stages(data_path, years[:size]).items():
+            if stages is not None and name not in stages:
+                continue
+            key = f"{name}@{size}"
+            results[key] = time_stage(fn, rows, repeat=repeat, memory=memory)
+            print(f"{key:<28} {results[key]['seconds']:>9.3f}s {results[key]['rows_per_second']:>14,.0f} rows/s"
+                  + (f" {results[key]['peak_mb']:>9.1f} MB" if memory else ""))
+    return {
+        "meta": {"python": platform.python_version(), "pandas": pd.__version__, "platform": platform.platform(), "seed": seed, "repeat": repeat},
+        "results": results,
+    }
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    # returns the stages that slowed down by more than `threshold` relative to the baseline
+    regressions = []
+    for key, result in current["results"].items():
+        if key not in baseline["results"]:
+            continue
+        ratio = result["seconds"] / baseline["results"][key]["seconds"]
+        status = "REGRESSION" if ratio > 1 + threshold else "ok"
+        print(f"{key:<28} {baseline['results'][key]['seconds']:>9.3f}s -> {result['seconds']:>9.3f}s ({ratio:.2f}x) {status}")
+        if ratio > 1 + threshold:
+            regressions.append(key)
+    return regressions
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Benchmark the comeback pipeline and app queries on synthetic play-by-play data.")
+    parser.add_argument("--data-path", default="./data/synthetic", help="synthetic seasons are generated here if missing")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="number of seasons per run")
+    parser.add_argument("--stages", nargs="+", default=None, help="only run these stages")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced run that measures peak memory")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="write results to this JSON file")
+    parser.add_argument("--compare", default=None, help="baseline JSON to compare against; exits 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+    current = run(args.data_path, sizes=args.sizes, stages=args.stages, repeat=args.repeat, memory=not args.no_memory, seed=args.seed)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+        print("Saved benchmark results to", args.output)
+    if args.compare is not None:
+        with open(args.compare) as f:
+            regressions = compare(current, json.load(f), threshold=args.threshold)
+        if regressions:
+            print(len(regressions), "stage(s) slowed down by more than", f"{args.threshold:.0%}:", ", ".join(regressions))
+            sys.exit(1)
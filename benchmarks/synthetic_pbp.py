@@ -0,0 +1,188 @@
+from argparse import ArgumentParser
+import os
+
+import numpy as np
+import pandas as pd
+
+from drive_viewer.constants.columns import GAME_COLS, PLAY_COLS
+from drive_viewer.constants.football import TEAM_NAMES
+from extract_comeback_data import GAMEINFO_COLS, SCORE_COLS, get_season_file
+
+TEAMS = sorted(TEAM_NAMES)
+REG_WEEKS = 17
+POST_GAMES_BY_WEEK = [6, 4, 2, 1]  # wild card, divisional, conference, Super Bowl
+PBP_COLS = list(dict.fromkeys(["play_id"] + GAME_COLS + PLAY_COLS + GAMEINFO_COLS + SCORE_COLS))
+
+QUARTER_SECONDS = 15 * 60
+GAME_SECONDS = 4 * QUARTER_SECONDS
+MEAN_PLAYS = 170
+MEAN_DRIVE_PLAYS = 6
+TD_RATE = 0.22
+FG_RATE = 0.15
+SAFETY_RATE = 0.005
+PAT_RATE = 0.94
+
+def get_schedule(year, rng):
+    # (week, season_type, home, away) for 16 games per regular-season week and a 13-game postseason
+    games = []
+    for week in range(1, REG_WEEKS + 1):
+        teams = rng.permutation(TEAMS)
+        games += [(week, "REG", home, away) for home, away in zip(teams[0::2], teams[1::2])]
+    for offset, n_games in enumerate(POST_GAMES_BY_WEEK):
+        teams = rng.permutation(TEAMS)[:2 * n_games]
+        games += [(REG_WEEKS + 1 + offset, "POST", home, away) for home, away in zip(teams[0::2], teams[1::2])]
+    return games
+
+def format_clock(seconds):
+    seconds = np.asarray(seconds, dtype=int)
+    return pd.Series(seconds // 60).astype(str).str.cat(pd.Series(seconds % 60).astype(str).str.zfill(2), sep=":")
+
+def format_yrdln(yardline_100, posteam, defteam):
+    # yardline_100 is the distance to the opponent's end zone, as in nflverse
+    own_half = yardline_100 > 50
+    side = np.where(own_half, posteam, defteam)
+    number = np.where(own_half, 100 - yardline_100, yardline_100)
+    yrdln = pd.Series(side).str.cat(pd.Series(number).astype(str), sep=" ")
+    return yrdln.where(number != 50, "MID 50"), np.where(number == 50, None, side)
+
+def generate_game(rng, year, week, season_type, home, away):
+    n = int(rng.normal(MEAN_PLAYS, 10))
+    # drives are runs of at least two plays; scoring happens on the last two plays of a drive (score, then PAT)
+    drive = np.cumsum(np.r_[True, False, rng.random(n - 2) < 1 / MEAN_DRIVE_PLAYS]).astype(float)
+    drive_end = np.r_[drive[1:] != drive[:-1], True]
+    drive_second_last = np.r_[drive_end[1:], False] & ~drive_end
+    home_receives = rng.random() < 0.5
+    home_offense = (drive % 2 == 1) == home_receives
+    posteam = np.where(home_offense, home, away)
+    defteam = np.where(home_offense, away, home)
+
+    n_drives = int(drive[-1])
+    outcome = rng.choice(["td", "fg", "safety", "none"], size=n_drives, p=[TD_RATE, FG_RATE, SAFETY_RATE, 1 - TD_RATE - FG_RATE - SAFETY_RATE])[drive.astype(int) - 1]
+    touchdown = drive_second_last & (outcome == "td")
+    extra_point = drive_end & (outcome == "td")
+    field_goal = drive_end & (outcome == "fg")
+    safety = drive_end & (outcome == "safety")
+    pat_good = extra_point & (rng.random(n) < PAT_RATE)
+    posteam_points = 6 * touchdown + pat_good + 3 * field_goal
+    home_points = np.where(home_offense, posteam_points, 2 * safety)
+    away_points = np.where(home_offense, 2 * safety, posteam_points)
+    total_home_score = np.cumsum(home_points)
+    total_away_score = np.cumsum(away_points)
+    home_pre = total_home_score - home_points
+    away_pre = total_away_score - away_points
+
+    elapsed = np.sort(rng.uniform(0, GAME_SECONDS - 1, n)).astype(int)
+    elapsed[0] = 0
+    qtr = elapsed // QUARTER_SECONDS + 1
+    quarter_remaining = QUARTER_SECONDS - elapsed % QUARTER_SECONDS
+    game_seconds_remaining = GAME_SECONDS - elapsed
+
+    yards_gained = np.clip(rng.normal(5, 8, n).round(), -10, 60)
+    yardline_100 = rng.integers(1, 100, n)
+    down = np.where(drive_end | extra_point, np.nan, rng.integers(1, 5, n))
+    ydstogo = np.minimum(rng.integers(1, 16, n), yardline_100)
+    yrdln, side_of_field = format_yrdln(yardline_100, posteam, defteam)
+    end_yardline_100 = np.clip(yardline_100 - yards_gained, 1, 99).astype(int)
+    end_yard_line, _ = format_yrdln(end_yardline_100, posteam, defteam)
+    play_type = np.where(rng.random(n) < 0.58, "pass", "run").astype(object)
+    play_type[field_goal] = "field_goal"
+    play_type[extra_point] = "extra_point"
+    play_type[drive_end & ~(field_goal | extra_point | safety) & (rng.random(n) < 0.6)] = "punt"
+    play_type[0] = "kickoff"
+
+    # win probability from a logistic in the current margin, sharpening as the clock runs down
+    margin = np.where(home_offense, home_pre - away_pre, away_pre - home_pre)
+    wp = 1 / (1 + np.exp(-margin / (2 + 10 * game_seconds_remaining / GAME_SECONDS)))
+    wp = np.clip(wp + rng.normal(0, 0.03, n), 0.001, 0.999)
+    home_wp = np.where(home_offense, wp, 1 - wp)
+    posteam_timeouts = np.maximum(3 - rng.binomial(3, elapsed / GAME_SECONDS), 0)
+    penalty = (rng.random(n) < 0.07).astype(float)
+
+    game = pd.DataFrame({
+        "play_id": np.arange(1, n + 1) * 22 + 1,
+        "game_id": f"{year}_{week:02d}_{away}_{home}",
+        "home_team": home,
+        "away_team": away,
+        "season_type": season_type,
+        "season": year,
+        "start_time": "13:00:00",
+        "stadium": f"{home} Stadium",
+        "weather": None,
+        "week": week,
+        "game_date": (pd.Timestamp(year, 9, 8) + pd.Timedelta(weeks=week - 1)).strftime("%Y-%m-%d"),
+        "home_score": total_home_score[-1],
+        "away_score": total_away_score[-1],
+        "posteam": posteam,
+        "posteam_type": np.where(home_offense, "home", "away"),
+        "defteam": defteam,
+        "side_of_field": side_of_field,
+        "yardline_100": yardline_100.astype(float),
+        "total_home_score": total_home_score,
+        "total_away_score": total_away_score,
+        "drive": drive,
+        "sp": (posteam_points + 2 * safety > 0).astype(int),
+        "qtr": qtr,
+        "down": down,
+        "goal_to_go": (ydstogo == yardline_100).astype(int),
+        "time": format_clock(quarter_remaining),
+        "end_clock_time": "13:00:00",
+        "end_yard_line": end_yard_line,
+        "yrdln": yrdln,
+        "ydstogo": ydstogo,
+        "ydsnet": pd.Series(yards_gained).groupby(drive).cumsum().to_numpy(),
+        "desc": pd.Series(posteam).str.cat(pd.Series(play_type).astype(str), sep=" ") + " for " + pd.Series(yards_gained.astype(int)).astype(str) + " yards",
+        "play_type": play_type,
+        "yards_gained": yards_gained,
+        "first_down": (yards_gained >= ydstogo).astype(float),
+        "timeout": 0.,
+        "timeout_team": None,
+        "posteam_timeouts_remaining": posteam_timeouts.astype(float),
+        "defteam_timeouts_remaining": posteam_timeouts.astype(float),
+        "game_seconds_remaining": game_seconds_remaining,
+        "wp": wp,
+        "def_wp": 1 - wp,
+        "home_wp": home_wp,
+        "away_wp": 1 - home_wp,
+        "penalty": penalty,
+        "penalty_yards": penalty * 5,
+        "safety": safety.astype(float),
+        "fumble_lost": (rng.random(n) < 0.01).astype(float),
+        "sack": ((play_type == "pass") & (rng.random(n) < 0.06)).astype(float),
+        "touchdown": touchdown.astype(float),
+        "interception": ((play_type == "pass") & (rng.random(n) < 0.025)).astype(float),
+        "extra_point_attempt": extra_point.astype(float),
+        "two_point_attempt": 0.,
+        "field_goal_attempt": field_goal.astype(float),
+        "field_goal_result": np.where(field_goal, "made", None),
+        "posteam_score": np.where(home_offense, home_pre, away_pre),
+        "defteam_score": np.where(home_offense, away_pre, home_pre),
+        "posteam_score_post": np.where(home_offense, total_home_score, total_away_score),
+        "defteam_score_post": np.where(home_offense, total_away_score, total_home_score),
+    })
+    return game[PBP_COLS]
+
+def generate_season(year, seed=0):
+    # deterministic for a given (year, seed); games are ordered by game_id like the nflverse files
+    rng = np.random.default_rng([seed, year])
+    games = [generate_game(rng, year, *game) for game in get_schedule(year, rng)]
+    df = pd.concat(games, ignore_index=True)
+    return df.sort_values("game_id", kind="stable").reset_index(drop=True)
+
+def write_seasons(data_path, years, seed=0):
+    os.makedirs(data_path, exist_ok=True)
+    paths = []
+    for year in years:
+        path = get_season_file(data_path, year)
+        generate_season(year, seed=seed).to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Write synthetic nflverse-style play-by-play seasons.")
+    parser.add_argument("--data-path", default="./data/synthetic")
+    parser.add_argument("--begin-year", type=int, default=1999)
+    parser.add_argument("--end-year", type=int, default=2023)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    for path in write_seasons(args.data_path, range(args.begin_year, args.end_year + 1), seed=args.seed):
+        print("Wrote", path)
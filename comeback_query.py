@@ -0,0 +1,166 @@
+from argparse import ArgumentParser
+
+import numpy as np
+import pandas as pd
+
+from comeback_store import load_table
+
+QUERY_COLS = ["game_id", "year", "season_type", "max_future_deficit", "deficit_end_seconds", "score_team_wp_at_deficit"]
+COMEBACK_LEVELS = [  # (comebacks per season above which the level applies, level), most common first
+    (16, "Come on, we see these like, once a week."),
+    (8, "Yeah, could happen."),
+    (4, "There's a few every season..."),
+    (2, "There's a *very* few every season..."),
+    (1, "There's like, one or two every season."),
+    (0.5, "Maybe next season..."),
+    (0.2, "If successful, this game will get its own Wikipedia page."),
+    (0, "Might as well get some lottery tickets..."),
+]
+UNPRECEDENTED = "UNPRECEDENTED!"
+
+def filter_comebacks(df, deficit, game_time, include_postseason):
+    deficit_df = df[(df["max_future_deficit"] >= deficit) & (df["deficit_end_seconds"] >= game_time)]
+    if not include_postseason:
+        deficit_df = deficit_df[deficit_df["season_type"] == "REG"]
+    return deficit_df
+
+WP_LEVELS = np.round(np.arange(0, 0.301, 0.01), 2)  # steps of the "Maximum win probability" slider
+WP_TOLERANCE = 1e-9
+TIME_SPAN = 1 << 13  # game seconds, including overtime, fit below this
+
+class ComebackCounts:
+    # answers "how many distinct games have a comeback row with deficit >= d, time >= t, season in [a, b],
+    # WP <= w" without touching the comeback rows. For every deficit level, WP level, season type and season,
+    # the latest qualifying deficit time of each game is kept in one sorted segment of `keys`; a count is
+    # then one searchsorted per selected segment
+
+    def __init__(self, df, deficit_levels, wp_levels=WP_LEVELS):
+        self.deficit_levels = np.asarray(deficit_levels)
+        self.wp_levels = np.append(np.asarray(wp_levels, dtype=float), np.inf)  # the last level means no WP filter
+        game_codes, _ = pd.factorize(df["game_id"], sort=True)
+        self.years = np.sort(df["year"].unique())
+        order = np.argsort(game_codes, kind="stable")
+        game_codes = game_codes[order]
+        starts = np.flatnonzero(np.r_[True, game_codes[1:] != game_codes[:-1]])
+        game_year = np.searchsorted(self.years, df["year"].to_numpy()[order][starts])
+        game_post = (df["season_type"].to_numpy()[order][starts] != "REG").astype(int)
+
+        # rows that never satisfy time >= t get a negative time
+        deficit = df["max_future_deficit"].to_numpy(dtype=float)[order]
+        time = np.floor(df["deficit_end_seconds"].to_numpy(dtype=float)[order])
+        time = np.where(np.isnan(time), -1, time).astype(np.int32)
+        # compared in the column's own precision, like the DataFrame filter does
+        wp = df["score_team_wp_at_deficit"].to_numpy()[order]
+        wp_ok = np.where(np.isnan(wp), np.inf, wp)[:, None] <= self.wp_levels.astype(wp.dtype)[None, :]
+        n_wp, n_years = len(self.wp_levels), len(self.years)
+
+        keys = []
+        for deficit_idx, level in enumerate(self.deficit_levels):
+            row_time = np.where(wp_ok & (deficit >= level)[:, None], time[:, None], -1)
+            game_time = np.maximum.reduceat(row_time, starts, axis=0) if len(starts) else row_time
+            game_idx, wp_idx = np.nonzero(game_time >= 0)
+            segment = ((deficit_idx * n_wp + wp_idx) * 2 + game_post[game_idx]) * n_years + game_year[game_idx]
+            keys.append(segment * TIME_SPAN + game_time[game_idx, wp_idx])
+        self.keys = np.sort(np.concatenate(keys)) if keys else np.array([], dtype=np.int64)
+        n_segments = len(self.deficit_levels) * n_wp * 2 * n_years
+        self.offsets = np.searchsorted(self.keys, np.arange(n_segments + 1) * TIME_SPAN)
+
+    def count_games(self, deficit, game_time, include_postseason=True, min_year=None, max_year=None, max_wp=None):
+        return int(self.count_games_batch(deficit, game_time, include_postseason, min_year, max_year, max_wp))
+
+    def count_games_batch(self, deficits, game_times, include_postseason=True, min_years=None, max_years=None, max_wps=None):
+        # like count_games, but every argument except include_postseason may be an array; arrays are broadcast
+        # against each other and the counts come back in the broadcast shape
+        deficits, game_times, min_years, max_years, max_wps = np.broadcast_arrays(
+            deficits,
+            game_times,
+            self.years[0] if min_years is None else min_years,
+            self.years[-1] if max_years is None else max_years,
+            np.inf if max_wps is None else np.where(pd.isnull(max_wps), np.inf, max_wps),
+        )
+        if (deficits < self.deficit_levels[0]).any() or (deficits > self.deficit_levels[-1]).any():
+            raise ValueError(f"deficits must be within the precomputed levels {self.deficit_levels[0]}-{self.deficit_levels[-1]}")
+        deficit_idx = np.searchsorted(self.deficit_levels, deficits)[..., None]
+        # caps must be WP levels (up to float noise, as from a slider); others would be rounded down silently
+        max_wps = max_wps.astype(float)
+        wp_idx = np.searchsorted(self.wp_levels, max_wps + WP_TOLERANCE, side="right") - 1
+        if not np.isclose(self.wp_levels[np.maximum(wp_idx, 0)], max_wps, rtol=0, atol=WP_TOLERANCE).all():
+            raise ValueError(f"max_wps must be None or one of the precomputed WP levels {self.wp_levels[:-1].tolist()}")
+        wp_idx = wp_idx[..., None]
+        times = np.clip(np.ceil(game_times.astype(float)), 0, TIME_SPAN).astype(np.int64)[..., None]
+        year_idx = np.arange(len(self.years))
+        selected = (year_idx >= np.searchsorted(self.years, min_years)[..., None]) \
+            & (year_idx < np.searchsorted(self.years, max_years, side="right")[..., None]) \
+            & (wp_idx >= 0)
+        counts = np.zeros(deficits.shape, dtype=np.int64)
+        for post in [0, 1] if include_postseason else [0]:
+            segments = ((deficit_idx * len(self.wp_levels) + np.maximum(wp_idx, 0)) * 2 + post) * len(self.years) + year_idx
+            in_segment = self.offsets[segments + 1] - np.searchsorted(self.keys, segments * TIME_SPAN + times)
+            counts += np.where(selected, in_segment, 0).sum(axis=-1)
+        return counts
+
+def get_comeback_rate(n_games, n_seasons):
+    return n_games / n_seasons
+
+def get_comeback_level(rate):
+    for threshold, level in COMEBACK_LEVELS:
+        if rate > threshold:
+            return level
+    return UNPRECEDENTED
+
+def get_comeback_rate_surface(counts, deficits, game_times, max_wps=(None,), season_ranges=None, include_postseason=True):
+    # one row per combination of the given deficits, game times, WP caps and (min_year, max_year) ranges;
+    # rates are comebacks per season in the range
+    season_ranges = [(counts.years[0], counts.years[-1])] if season_ranges is None else season_ranges
+    wp_values = np.array([np.nan if wp is None else wp for wp in max_wps], dtype=float)
+    deficit_grid, time_grid, wp_grid, range_grid = np.meshgrid(
+        np.asarray(deficits), np.asarray(game_times), wp_values, np.arange(len(season_ranges)), indexing="ij",
+    )
+    min_years = np.array([first for first, _ in season_ranges])[range_grid]
+    max_years = np.array([last for _, last in season_ranges])[range_grid]
+    n_games = counts.count_games_batch(deficit_grid, time_grid, include_postseason, min_years, max_years, wp_grid)
+    rates = get_comeback_rate(n_games, max_years - min_years + 1)
+    return pd.DataFrame({
+        "deficit": deficit_grid.ravel(),
+        "game_time": time_grid.ravel(),
+        "max_wp": wp_grid.ravel(),
+        "min_year": min_years.ravel(),
+        "max_year": max_years.ravel(),
+        "n_games": n_games.ravel(),
+        "rate": rates.ravel(),
+        "level": np.select([rates.ravel() > threshold for threshold, _ in COMEBACK_LEVELS], [level for _, level in COMEBACK_LEVELS], UNPRECEDENTED),
+    })
+
+def _parse_season_range(value):
+    first, _, last = value.partition("-")
+    return int(first), int(last or first)
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Comeback counts and rates for a grid of game states.")
+    parser.add_argument("--data-path", default="./data")
+    parser.add_argument("--deficits", type=int, nargs="+", default=list(range(17, 36)))
+    parser.add_argument("--game-times", type=int, nargs="+", default=list(range(0, 3601, 300)), help="seconds elapsed")
+    parser.add_argument("--max-wp", type=float, nargs="+", default=None, help="WP caps; default is no cap")
+    parser.add_argument("--seasons", type=_parse_season_range, nargs="+", default=None, help="season ranges such as 1999-2023 or 2010")
+    parser.add_argument("--regular-season", action="store_true", help="exclude postseason games")
+    parser.add_argument("--output", default=None, help="write the table to this CSV instead of printing it")
+    args = parser.parse_args()
+
+    min_year = None if args.seasons is None else min(first for first, _ in args.seasons)
+    max_year = None if args.seasons is None else max(last for _, last in args.seasons)
+    df = load_table(args.data_path, "comebacks", min_year, max_year, QUERY_COLS)
+    wp_levels = WP_LEVELS if args.max_wp is None else np.union1d(WP_LEVELS, args.max_wp)
+    counts = ComebackCounts(df, range(min(args.deficits), max(args.deficits) + 1), wp_levels)
+    surface = get_comeback_rate_surface(
+        counts,
+        args.deficits,
+        args.game_times,
+        max_wps=(None,) if args.max_wp is None else args.max_wp,
+        season_ranges=args.seasons,
+        include_postseason=not args.regular_season,
+    )
+    if args.output is None:
+        print(surface.to_string(index=False))
+    else:
+        surface.to_csv(args.output, index=False)
+        print("Saved comeback rate surface to", args.output)
@@ -0,0 +1,264 @@
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from pbp_reader import PBP_DTYPES, compact_frame, concat_frames
+
+MANIFEST_FILE = "manifest.json"
+VERSION_FILE = "data_version.json"
+SEASON_DIR = "seasons"
+HASH_CHUNK_SIZE = 1 << 20
+LOOKUP_ROW_GROUP_SIZE = 1 << 10  # small row groups for tables read a few rows at a time
+
+# in-memory schema of the extracted tables; integer columns with missing values fall back to float32
+TABLE_DTYPES = {
+    **PBP_DTYPES,
+    "year": "int16",
+    "game_id": "category",
+    "game_date": "category",
+    "time": "category",
+    "max_future_deficit": "int16",
+    "deficit_end": "category",
+    "deficit_end_qtr": "int8",
+    "deficit_end_seconds": "int16",
+    "deficit_posteam_score": "int16",
+    "deficit_defteam_score": "int16",
+    "score_team_at_deficit": "category",
+    "score_team_wp_at_deficit": "float32",
+    "winning_team": "category",
+    "losing_team": "category",
+    "winning_score": "int16",
+    "losing_score": "int16",
+}
+
+def file_signature(path, previous=None):
+    # size + mtime are checked first; the content hash is only recomputed when either changed
+    stat = os.stat(path)
+    signature = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if previous is not None and all(previous.get(key) == value for key, value in signature.items()):
+        signature["sha256"] = previous["sha256"]
+        return signature
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            sha.update(chunk)
+    signature["sha256"] = sha.hexdigest()
+    return signature
+
+def load_manifest(data_path, version):
+    # a manifest written by a different extraction version is treated as empty
+    path = os.path.join(data_path, MANIFEST_FILE)
+    if os.path.exists(path):
+        with open(path) as f:
+            manifest = json.load(f)
+        if manifest.get("version") == version:
+            return manifest
+    return {"version": version, "seasons": {}}
+
+def save_manifest(data_path, manifest):
+    path = os.path.join(data_path, MANIFEST_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+def get_partition_path(data_path, name, year):
+    return os.path.join(data_path, SEASON_DIR, f"{name}_{year}.pkl")
+
+def is_season_current(data_path, manifest, year, signature):
+    entry = manifest["seasons"].get(str(year))
+    return entry is not None \
+        and entry["input"]["sha256"] == signature["sha256"] \
+        and all(os.path.exists(get_partition_path(data_path, name, year)) for name in ["comebacks", "scoring_summaries"])
+
+def save_season_partition(data_path, year, comebacks, summary):
+    os.makedirs(os.path.join(data_path, SEASON_DIR), exist_ok=True)
+    comebacks.to_pickle(get_partition_path(data_path, "comebacks", year))
+    summary.to_pickle(get_partition_path(data_path, "scoring_summaries", year))
+
+def load_season_partition(data_path, year):
+    return (
+        pd.read_pickle(get_partition_path(data_path, "comebacks", year)),
+        pd.read_pickle(get_partition_path(data_path, "scoring_summaries", year)),
+    )
+
+def get_table_dir(data_path, name):
+    return os.path.join(data_path, name)
+
+def get_table_partition_path(data_path, name, year):
+    return os.path.join(get_table_dir(data_path, name), f"{year}.parquet")
+
+def is_table_partition_current(data_path, name, year):
+    # written after the season's extracted partition was last saved; catches interrupted runs and seasons
+    # re-extracted while the output format was CSV
+    path = get_table_partition_path(data_path, name, year)
+    season_path = get_partition_path(data_path, name, year)
+    return os.path.exists(path) and (not os.path.exists(season_path) or os.stat(path).st_mtime_ns >= os.stat(season_path).st_mtime_ns)
+
+def write_partitioned_table(data_path, name, dfs, years, row_group_size=None, stale_years=None):
+    # one typed parquet file per season; partitions for seasons outside `years` are removed. With stale_years,
+    # the other seasons are only rewritten if their partition is not current. read_table_rows only reads the
+    # row groups it needs, so tables looked up by key should use a small row_group_size
+    table_dir = get_table_dir(data_path, name)
+    os.makedirs(table_dir, exist_ok=True)
+    for filename in os.listdir(table_dir):
+        if filename.endswith(".parquet") and int(filename.split(".")[0]) not in years:
+            os.remove(os.path.join(table_dir, filename))
+    for year, df in zip(years, dfs):
+        if stale_years is not None and year not in stale_years and is_table_partition_current(data_path, name, year):
+            continue
+        path = get_table_partition_path(data_path, name, year)
+        df.assign(year=np.int16(year)).to_parquet(path + ".tmp", index=False, row_group_size=row_group_size)
+        os.replace(path + ".tmp", path)
+    return table_dir
+
+def get_index_path(data_path, name):
+    return os.path.join(data_path, f"{name}_index.csv")
+
+def _offset_frame(df, key):
+    # one row per run of equal keys; df must be sorted (or at least grouped) by key
+    keys = df[key].to_numpy()
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.array([], dtype=int)
+    return pd.DataFrame({key: keys[starts], "start": starts, "end": np.r_[starts[1:], len(keys)].astype(int)})
+
+def build_offset_index(df, key="game_id"):
+    # key -> (start, end) row offsets, so df.iloc[start:end] returns a key's rows without scanning df
+    offsets = _offset_frame(df, key)
+    return dict(zip(offsets[key], zip(offsets["start"].tolist(), offsets["end"].tolist())))
+
+def _season_offset_frame(dfs, years, key):
+    return pd.concat([_offset_frame(df, key).assign(year=year) for year, df in zip(years, dfs)], ignore_index=True)
+
+def build_season_offset_index(df, key="game_id"):
+    # key -> (year, start, end) row offsets within the key's season, for read_table_rows; df needs a year column
+    years, dfs = zip(*df.groupby("year", sort=True, observed=True)) if len(df) else ((), ())
+    return _season_offset_dict(_season_offset_frame([season_df.reset_index(drop=True) for season_df in dfs], years, key), key)
+
+def _season_offset_dict(index, key):
+    return dict(zip(index[key], zip(index["year"].tolist(), index["start"].tolist(), index["end"].tolist())))
+
+def write_offset_index(data_path, name, dfs, years, key="game_id"):
+    # offsets are stored relative to each season so they stay valid for any contiguous range of seasons
+    index = _season_offset_frame(dfs, years, key)
+    path = get_index_path(data_path, name)
+    index.to_csv(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+    return path
+
+def load_offset_index(data_path, name, min_year=None, max_year=None, key="game_id", rebase=True):
+    # offsets into load_table(data_path, name, min_year, max_year), or with rebase=False, key -> (year, start, end)
+    # offsets for read_table_rows; None if no index was extracted
+    path = get_index_path(data_path, name)
+    if not os.path.exists(path):
+        return None
+    index = pd.read_csv(path)
+    if min_year is not None:
+        index = index[index["year"] >= min_year]
+    if max_year is not None:
+        index = index[index["year"] <= max_year]
+    if not rebase:
+        return _season_offset_dict(index, key)
+    season_rows = index.groupby("year")["end"].max()
+    base = index["year"].map(season_rows.cumsum() - season_rows)
+    return dict(zip(index[key], zip((index["start"] + base).tolist(), (index["end"] + base).tolist())))
+
+def get_table_version(data_path, name):
+    # changes whenever the table is re-extracted; cheap enough to check on every rerun
+    table_dir = get_table_dir(data_path, name)
+    if os.path.isdir(table_dir):
+        paths = [os.path.join(table_dir, filename) for filename in os.listdir(table_dir)]
+    else:
+        paths = [os.path.join(data_path, f"{name}.csv")]
+    return max(os.stat(path).st_mtime_ns for path in paths)
+
+def write_data_version(data_path, manifest, years, output_format):
+    # written after every table, so a reader that sees a new version also finds the tables it describes. The
+    # version only depends on what was extracted, so re-running on unchanged inputs does not trigger reloads
+    inputs = {str(year): manifest["seasons"][str(year)]["input"]["sha256"] for year in years}
+    key = json.dumps({"extraction_version": manifest["version"], "output_format": output_format, "inputs": inputs}, sort_keys=True)
+    stamp = {
+        "version": hashlib.sha256(key.encode()).hexdigest()[:16],
+        "written": time.time(),
+        "years": years,
+        "output_format": output_format,
+    }
+    path = os.path.join(data_path, VERSION_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(stamp, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+    return stamp["version"]
+
+def read_data_stamp(data_path):
+    # (version, time it was written), cheap enough to call on every rerun; data extracted before version
+    # stamps falls back to table mtimes
+    try:
+        with open(os.path.join(data_path, VERSION_FILE)) as f:
+            stamp = json.load(f)
+        return stamp["version"], stamp.get("written")
+    except FileNotFoundError:
+        mtime_ns = max(get_table_version(data_path, name) for name in ["comebacks", "scoring_summaries"])
+        return str(mtime_ns), mtime_ns / 1e9
+
+def read_data_version(data_path):
+    return read_data_stamp(data_path)[0]
+
+def read_output_format(data_path):
+    # format of the latest extraction, or None for data extracted before version stamps
+    try:
+        with open(os.path.join(data_path, VERSION_FILE)) as f:
+            return json.load(f).get("output_format")
+    except FileNotFoundError:
+        return None
+
+def is_table_partitioned(data_path, name):
+    # the stamped format decides, so tables left over from an extraction in the other format are never read
+    output_format = read_output_format(data_path)
+    if output_format is None:
+        return os.path.isdir(get_table_dir(data_path, name))
+    return output_format == "parquet"
+
+def get_table_years(data_path, name):
+    table_dir = get_table_dir(data_path, name)
+    return sorted(int(filename.split(".")[0]) for filename in os.listdir(table_dir) if filename.endswith(".parquet"))
+
+def load_table(data_path, name, min_year=None, max_year=None, columns=None):
+    # reads only the partitions in [min_year, max_year] and only the requested columns, typed with TABLE_DTYPES
+    return compact_frame(_read_table(data_path, name, min_year, max_year, columns), TABLE_DTYPES)
+
+def read_table_rows(data_path, name, year, start, end, columns=None):
+    # rows [start, end) of one season, e.g. from load_offset_index(..., rebase=False). parquet partitions are
+    # memory-mapped and only the row groups overlapping the range are read; the CSV fallback has to parse the
+    # whole file, so callers reading many row ranges of a CSV table should load it once instead
+    path = get_table_partition_path(data_path, name, year)
+    if not is_table_partitioned(data_path, name):
+        return load_table(data_path, name, year, year, columns).iloc[start:end].reset_index(drop=True)
+    parquet_file = pq.ParquetFile(path, memory_map=True)
+    group_starts = np.cumsum([0] + [parquet_file.metadata.row_group(i).num_rows for i in range(parquet_file.num_row_groups)])
+    first = np.searchsorted(group_starts, start, side="right") - 1
+    last = np.searchsorted(group_starts, end, side="left")
+    df = parquet_file.read_row_groups(list(range(first, last)), columns=columns).to_pandas()
+    offset = group_starts[first]
+    return compact_frame(df.iloc[start - offset:end - offset].reset_index(drop=True), TABLE_DTYPES)
+
+def _read_table(data_path, name, min_year, max_year, columns):
+    # falls back to the flat CSV when the latest extraction wrote CSV (or, unstamped, no partitioned table exists)
+    if is_table_partitioned(data_path, name):
+        all_years = get_table_years(data_path, name)
+        years = [
+            year for year in all_years
+            if (min_year is None or year >= min_year) and (max_year is None or year <= max_year)
+        ]
+        if not years:
+            return pd.read_parquet(get_table_partition_path(data_path, name, all_years[0]), columns=columns).iloc[:0]
+        return concat_frames([pd.read_parquet(get_table_partition_path(data_path, name, year), columns=columns) for year in years])
+    usecols = None if columns is None else list(dict.fromkeys(list(columns) + ["year"]))
+    df = pd.read_csv(os.path.join(data_path, f"{name}.csv"), usecols=usecols)
+    if min_year is not None:
+        df = df[df["year"] >= min_year]
+    if max_year is not None:
+        df = df[df["year"] <= max_year]
+    return df.reset_index(drop=True) if columns is None else df.loc[:, columns].reset_index(drop=True)
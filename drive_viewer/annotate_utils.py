@@ -1,7 +1,9 @@
+import numpy as np
 import pandas as pd
 
-from drive_viewer.constants.football import DOWNS
+from drive_viewer.constants.football import DOWNS, PLAY_DICT, PLAY_MARKERS
 from drive_viewer.constants.text import WRAPPER
+from pbp_parsing import numeric_to_yrdln, yrdln_to_numeric
 
 def get_drive_title(drive_df):
     drive_series = drive_df.iloc[0]
@@ -11,73 +13,60 @@ def get_drive_title(drive_df):
     time = drive_series["time"]
     return f"<b>Drive #{int(drive)}:</b> {team}, Q{qtr} {time}"
 
+def _str(series):
+    # formats every value as an f-string would, including missing values ("nan"/"None")
+    return pd.Series(series.astype(object).map(str), index=series.index)
+
 def get_down_info(drive_df):
+    # "<b>{yrdln}: {down} & {togo} </b>", or the play type for plays without a down
+    down = drive_df["down"]
+    down_ord = pd.Series(np.array(DOWNS, dtype=object)[down.fillna(1).astype(int).to_numpy() - 1], index=drive_df.index)
+    with_down = "<b>" + _str(drive_df["yrdln"]) + ": " + down_ord + " & " + _str(drive_df["ydstogo"]) + " </b>"
+    return with_down.where(down.notnull(), "<b>" + _str(drive_df["play_type"]) + "</b>")
 
-    def get_down_tooltip(row):
-        down = row["down"]
-        if pd.isnull(down):
-            play_type = row["play_type"]
-            return f"<b>{play_type}</b>"
-        togo = row["ydstogo"]
-        yrdln = row["yrdln"]
-        down_ord = DOWNS[int(down) - 1]
-        return f"<b>{yrdln}: {down_ord} & {togo} </b>"
-    return drive_df.apply(get_down_tooltip, axis=1)
+def get_play_labels(drive_df):
+    # play type emoji followed by a marker for each PLAY_MARKERS flag set on the play
+    labels = _str(drive_df["play_type"].map(PLAY_DICT))
+    for col, emoji_suffix in PLAY_MARKERS.items():
+        labels = labels + pd.Series(np.where(drive_df[col] != 0, emoji_suffix, ""), index=drive_df.index)
+    return labels
 
 def get_tooltip_text(drive_df):
+    # built column by column; only the description wrapping is done play by play
+    is_home = drive_df["posteam_type"] == "home"
+    home_team = drive_df["posteam"].astype(object).where(is_home, drive_df["defteam"].astype(object))
+    away_team = drive_df["defteam"].astype(object).where(is_home, drive_df["posteam"].astype(object))
+    gain = drive_df["yards_gained"]
+    # end of play derived from the start and the gain, for plays whose end_yard_line is missing
+    derived_end = numeric_to_yrdln(
+        yrdln_to_numeric(drive_df["yrdln"], home_team) + (2 * is_home - 1) * gain,
+        home_team,
+        away_team,
+    )
 
-    def get_tooltip_for_play(row):
-        play_desc = WRAPPER.fill(row["desc"]).replace('\n', '<br>')
-        start = row["yrdln"]
-        end = row["end_yard_line"]
-
-        posteam_type = row["posteam_type"]
-        home_team = row["posteam"] if posteam_type == "home" else row["defteam"]
-        away_team = row["posteam"] if posteam_type != "home" else row["defteam"]
-        total_home_score = row["total_home_score"]
-        total_away_score = row["total_away_score"]
-
-        qtr = row["qtr"]
-        start_time = row["time"]
-        end_time = row["end_clock_time"]
-        gain = row["yards_gained"]
-        play_type = row["play_type"]
-
-        base_str = f"(Q{qtr} {start_time}, {home_team} {total_home_score} - {away_team} {total_away_score})"
-
-        if play_type == "no_play":
-            return f"<b>{start}</b><br>{play_desc}"
-
-        if pd.notnull(gain):
-            gain_str = f"{int(gain):+}"
-            if pd.isnull(end):
-                end = numeric_to_yrdln(
-                    yrdln_to_numeric(
-                        row["yrdln"],
-                        home_team
-                    ) + (2 * (posteam_type == "home") - 1) * int(gain),
-                    home_team,
-                    away_team)
-        else:
-            gain_str = "N/A"
-            return f"<b>{base_str} {start}<br>{play_desc}"
-
-        return f"<b>{base_str} {start}  ➤ {end} [{gain_str} yds]</b><br>Play selection: {play_type}<br>{play_desc}"
-
-    return drive_df.apply(get_tooltip_for_play, axis=1)
+    play_desc = pd.Series([WRAPPER.fill(desc).replace('\n', '<br>') for desc in drive_df["desc"]], index=drive_df.index, dtype=object)
+    start = _str(drive_df["yrdln"])
+    end = _str(drive_df["end_yard_line"].where(drive_df["end_yard_line"].notnull(), derived_end))
+    base_str = (
+        "(Q" + _str(drive_df["qtr"]) + " " + _str(drive_df["time"]) + ", "
+        + _str(home_team) + " " + _str(drive_df["total_home_score"]) + " - " + _str(away_team) + " " + _str(drive_df["total_away_score"]) + ")"
+    )
+    gain_int = gain.fillna(0).astype(int)
+    gain_str = pd.Series(np.where(gain_int < 0, "-", "+"), index=drive_df.index) + _str(gain_int.abs())
 
-def yrdln_to_numeric(row, home):
-    # home team moves right, away team moves left
-    side, num = row.split()
-    if home == side:
-        return int(num)
-    else:
-        return 100 - int(num)
+    no_play = "<b>" + start + "</b><br>" + play_desc
+    no_gain = "<b>" + base_str + " " + start + "<br>" + play_desc
+    full = (
+        "<b>" + base_str + " " + start + "  ➤ " + end + " [" + gain_str + " yds]</b><br>Play selection: "
+        + _str(drive_df["play_type"]) + "<br>" + play_desc
+    )
+    return full.where(gain.notnull(), no_gain).where(drive_df["play_type"] != "no_play", no_play)
 
-def numeric_to_yrdln(num, home, away):
-    if num < 50:
-        return f"{home} {num}"
-    elif num > 50:
-        return f"{away} {100 - num}"
-    else:
-        return "50"
+def get_play_annotations(game_df):
+    # every string the drive chart traces need, for all plays of a game at once; drive charts slice the rows
+    # of their drive, so both play traces share one build
+    return pd.DataFrame({
+        "tooltip": get_tooltip_text(game_df),
+        "down_info": get_down_info(game_df),
+        "play_label": get_play_labels(game_df),
+    })
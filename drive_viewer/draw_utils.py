@@ -2,6 +2,7 @@ import numpy as np
 import plotly.graph_objects as go
 
 from drive_viewer.constants.dimensions import (
+    DRIVE_PADDING,
     X_HOME_ENDZONE,
     X_AWAY_GOAL_LINE,
     X_HOME_10YD,
@@ -60,3 +61,38 @@ def add_end_zone_text(fig, home, away, y):
             ),
             textangle=90 if x_min == X_HOME_ENDZONE else 270
         )
+
+def get_segments(x0, y0, x1, y1):
+    # x and y of one line trace that draws every (x0, y0)-(x1, y1) segment, separated by None gaps
+    x = np.full(3 * len(x0), None, dtype=object)
+    y = np.full(3 * len(x0), None, dtype=object)
+    x[0::3], x[1::3] = x0, x1
+    y[0::3], y[1::3] = y0, y1
+    return x, y
+
+def get_yard_lines(drive_index):
+    return [
+        dict(
+            type="line",
+            x0=x,
+            y0=drive_index[0] + DRIVE_PADDING,
+            x1=x,
+            y1=drive_index[-1] - DRIVE_PADDING,
+            line=dict(
+                color="white",
+                width=1,
+            ),
+        )
+        for x in np.arange(X_HOME_10YD, X_AWAY_GOAL_LINE, X_NUMBER_SPACING)
+    ]
+
+def get_yard_line_trace(drive_index):
+    # trace equivalent of get_yard_lines()
+    yard_line_x = np.arange(X_HOME_10YD, X_AWAY_GOAL_LINE, X_NUMBER_SPACING)
+    yard_x, yard_y = get_segments(
+        yard_line_x,
+        np.full(len(yard_line_x), drive_index[0] + DRIVE_PADDING),
+        yard_line_x,
+        np.full(len(yard_line_x), drive_index[-1] - DRIVE_PADDING),
+    )
+    return go.Scatter(x=yard_x, y=yard_y, mode="lines", line=dict(color="white", width=1), hoverinfo="skip", showlegend=False)
@@ -0,0 +1,172 @@
+import os
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from drive_viewer.constants.columns import PLAY_COLS
+from drive_viewer.draw_utils import get_segments
+from drive_viewer.field_template import get_drive_index, get_field
+from pbp_parsing import yrdln_to_numeric
+
+OFFSET = 10
+# "traces" draws play segments, yard lines and penalty arrows as a few batched traces, whose cost hardly grows
+# with the number of plays; "shapes" draws them as one layout shape/annotation each
+RENDER_MODES = ["traces", "shapes"]
+
+def get_play_positions(df, home_team):
+    # x of the start and end of every play on the chart
+    play_direction_sign = 2 * (df["posteam_type"] == "home") - 1
+    play_start_series = yrdln_to_numeric(df["yrdln"], home_team) + OFFSET
+    return pd.DataFrame({"start": play_start_series, "end": play_start_series + play_direction_sign * df["yards_gained"]})
+
+def get_play_starts(play_start_series, annotations, drive_index):
+    return go.Scatter(
+        x=play_start_series,
+        y=drive_index,
+        mode="markers+text",
+        marker=dict(color="orange", size=12, line=dict(width=2, color='DarkSlateGrey')),
+        hoverinfo="text",
+        hovertext=annotations["tooltip"],
+        text=annotations["down_info"],
+        textposition="bottom center",
+        textfont_size=14,
+    )
+
+def get_play_ends(play_end_series, annotations, drive_index):
+    return go.Scatter(
+        x=play_end_series,
+        y=drive_index,
+        mode="markers+text",
+        marker=dict(color="blue", size=12, line=dict(width=2, color='DarkSlateGrey')),
+        hovertext=annotations["tooltip"],
+        showlegend=False,
+        hoverinfo="text",
+        text=annotations["play_label"],
+        textposition="top center",
+        textfont_size=20,
+    )
+
+def get_penalty_arrows(drive_df, play_start_series, play_end_series, drive_index):
+    drive_index = np.array(drive_index)
+    play_direction_sign = 2 * (drive_df["posteam_type"].iloc[0] == "home") - 1
+    penalty_mask = (drive_df["penalty"] == 1)
+    penalty_idx = drive_index[penalty_mask]
+    end_penalty = play_end_series.loc[penalty_mask]
+    arrows = [go.layout.Annotation(dict(
+        x=end_penalty.iloc[i] - play_direction_sign * drive_df.loc[penalty_mask, "penalty_yards"].iloc[i],
+        y=penalty_idx[i],
+        xref="x", yref="y",
+        text="",
+        showarrow=True,
+        axref="x",
+        ayref="y",
+        ax=end_penalty.iloc[i],
+        ay=penalty_idx[i],
+        arrowhead=3,
+        arrowwidth=1.5,
+        arrowcolor='yellow',)
+    ) for i in range(len(penalty_idx))]
+    return arrows
+
+
+def get_lines(drive_df, play_start_series, play_end_series, drive_index):
+    return [
+        dict(
+            type="line",
+            x0=play_start_series.iloc[i],
+            y0=drive_index[i],
+            x1=play_end_series.iloc[i],
+            y1=drive_index[i],
+            line=dict(
+                color="black",
+                width=2 if drive_df["play_type"].iloc[i] != "no_play" else 0,
+                dash="dash",
+            ),
+        )
+        for i in range(len(drive_df))
+    ]
+
+def get_line_traces(drive_df, play_start_series, play_end_series, drive_index):
+    # trace equivalent of get_lines(); no_play segments had zero width there, so they are left out
+    drive_index = np.asarray(drive_index)
+    played = (drive_df["play_type"] != "no_play").to_numpy()
+    play_x, play_y = get_segments(
+        play_start_series.to_numpy()[played], drive_index[played], play_end_series.to_numpy()[played], drive_index[played],
+    )
+    return [go.Scatter(x=play_x, y=play_y, mode="lines", line=dict(color="black", width=2, dash="dash"), hoverinfo="skip", showlegend=False)]
+
+def get_penalty_traces(drive_df, play_start_series, play_end_series, drive_index):
+    # trace equivalent of get_penalty_arrows(): one line trace for the shafts, one marker trace for the heads
+    play_direction_sign = 2 * (drive_df["posteam_type"].iloc[0] == "home") - 1
+    penalty_mask = (drive_df["penalty"] == 1).to_numpy()
+    penalty_idx = np.asarray(drive_index)[penalty_mask]
+    tail = play_end_series.to_numpy()[penalty_mask]
+    head = tail - play_direction_sign * drive_df["penalty_yards"].to_numpy()[penalty_mask]
+    shaft_x, shaft_y = get_segments(tail, penalty_idx, head, penalty_idx)
+    return [
+        go.Scatter(x=shaft_x, y=shaft_y, mode="lines", line=dict(color="yellow", width=1.5), hoverinfo="skip", showlegend=False),
+        go.Scatter(
+            x=head,
+            y=penalty_idx,
+            mode="markers",
+            marker=dict(color="yellow", size=8, symbol=np.where(head < tail, "triangle-left", "triangle-right")),
+            hoverinfo="skip",
+            showlegend=False,
+        ),
+    ]
+
+def create_drive_chart(drive_df, annotations, positions=None, render_mode="traces"):
+    # positions: get_play_positions() rows of the drive, when they were computed for the whole game
+
+    home_team = drive_df["home_team"].iloc[0]
+    away_team = drive_df["away_team"].iloc[0]
+    drive_df = drive_df[PLAY_COLS]
+    drive_index = get_drive_index(len(drive_df))
+
+    positions = get_play_positions(drive_df, home_team) if positions is None else positions
+    play_start_series, play_end_series = positions["start"], positions["end"]
+    play_starts = get_play_starts(play_start_series, annotations, drive_index)
+    play_ends = get_play_ends(play_end_series, annotations, drive_index)
+
+    # the field is shared by every drive of the same teams; only the play traces are built here
+    field = get_field(home_team, away_team, len(drive_df), render_mode)
+    if render_mode == "traces":
+        data = get_line_traces(drive_df, play_start_series, play_end_series, drive_index) \
+            + get_penalty_traces(drive_df, play_start_series, play_end_series, drive_index)
+    else:
+        data = []
+    # the field and the play traces were validated when they were built, so the figure is assembled from their
+    # JSON without validating everything again, which would otherwise dominate the cost of a chart
+    layout = field["layout"]
+    if render_mode == "shapes":
+        lines = [go.layout.Shape(line).to_plotly_json() for line in get_lines(drive_df, play_start_series, play_end_series, drive_index)]
+        arrows = [arrow.to_plotly_json() for arrow in get_penalty_arrows(drive_df, play_start_series, play_end_series, drive_index)]
+        layout["shapes"] = lines + layout.get("shapes", [])
+        layout["annotations"] = arrows + layout.get("annotations", [])
+    fig = go.Figure(dict(
+        data=field["data"] + [trace.to_plotly_json() for trace in data + [play_starts, play_ends]],
+        layout=layout,
+    ), _validate=False)
+    return drive_df, fig
+
+def create_game_charts(game_df, annotations, render_mode="traces"):
+    # (drive_df, fig) for every drive of the game, in drive order; play positions are computed once for the
+    # game. game_df must have each drive's plays contiguous, as SeasonIndex.get_game() does
+    positions = get_play_positions(game_df, game_df["home_team"].iloc[0])
+    drive = game_df["drive"].to_numpy()
+    starts = np.flatnonzero(np.r_[True, drive[1:] != drive[:-1]])
+    ends = np.r_[starts[1:], len(drive)]
+    return [
+        create_drive_chart(game_df.iloc[start:end], annotations.iloc[start:end], positions.iloc[start:end], render_mode)
+        for start, end in zip(starts, ends)
+    ]
+
+def get_chart_path(chart_dir, season, game_id, drive_no, fmt="json"):
+    return os.path.join(chart_dir, str(season), game_id, f"drive_{drive_no}.{fmt}")
+
+def load_exported_chart(chart_dir, season, game_id, drive_no):
+    # a figure written by export_charts, or None if that drive was not exported
+    path = get_chart_path(chart_dir, season, game_id, drive_no)
+    return pio.read_json(path) if os.path.exists(path) else None
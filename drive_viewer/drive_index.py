@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+
+from pbp_parsing import format_game_clock
+
+class SeasonIndex:
+    # season -> week -> game -> drive, each level a contiguous row range of `plays`, so every selection in the
+    # drive viewer is a slice instead of a scan. plays are the season's charted plays (with a drive and a
+    # play_type), sorted by week, game and drive with play order kept, and yrdln back-filled within each game
+
+    def __init__(self, season_df):
+        plays = season_df.dropna(subset=["drive", "play_type"])
+        plays = plays.assign(yrdln=plays.groupby("game_id", sort=False)["yrdln"].bfill())
+        self.plays = plays.sort_values(["week", "game_id", "drive"], kind="stable").reset_index(drop=True)
+
+        week = self.plays["week"].to_numpy()
+        game = self.plays["game_id"].to_numpy()
+        drive = self.plays["drive"].to_numpy()
+        n = len(self.plays)
+        new_game = np.r_[True, game[1:] != game[:-1]] if n else np.array([], dtype=bool)
+        new_drive = new_game | np.r_[False, drive[1:] != drive[:-1]][:n]
+        game_starts = np.flatnonzero(new_game)
+        drive_starts = np.flatnonzero(new_drive)
+
+        # drive level: one row per drive with the metadata its selector label needs
+        first_plays = self.plays.iloc[drive_starts]
+        self.drives = pd.DataFrame({
+            "game_id": game[drive_starts],
+            "drive": drive[drive_starts],
+            "start": drive_starts,
+            "end": np.r_[drive_starts[1:], n].astype(int),
+            "posteam": first_plays["posteam"].to_numpy(),
+            "qtr": first_plays["qtr"].to_numpy(),
+            "time": first_plays["time"].to_numpy(),
+        })
+        self._drive_rows = self.drives[["start", "end"]].to_numpy().tolist()
+        drive_number = self.drives.groupby("game_id", sort=False).cumcount() + 1
+        self.drives["label"] = (
+            "(" + format_game_clock(self.drives["qtr"], self.drives["time"]) + ") Drive " + drive_number.astype(str)
+            + " (" + self.drives["posteam"].astype(str) + ")"
+        )
+
+        # game level: play rows and drive rows of each game
+        game_ends = np.r_[game_starts[1:], n].astype(int)
+        drive_game_starts = np.searchsorted(drive_starts, game_starts)
+        drive_game_ends = np.r_[drive_game_starts[1:], len(self.drives)].astype(int)
+        self.games = {
+            game_id: (start, end, drive_start, drive_end)
+            for game_id, start, end, drive_start, drive_end
+            in zip(game[game_starts], game_starts.tolist(), game_ends.tolist(), drive_game_starts.tolist(), drive_game_ends.tolist())
+        }
+
+        # week level: games in play order
+        self.weeks = {}
+        for game_id, start in zip(game[game_starts], game_starts.tolist()):
+            self.weeks.setdefault(week[start].item(), []).append(game_id)
+
+    def get_weeks(self):
+        return list(self.weeks)
+
+    def get_games(self, week):
+        return self.weeks[week]
+
+    def get_game(self, game_id):
+        start, end, _, _ = self.games[game_id]
+        return self.plays.iloc[start:end]
+
+    def get_drives(self, game_id):
+        # one row per drive of the game: drive, start/end rows in plays, posteam, qtr, time and label
+        _, _, drive_start, drive_end = self.games[game_id]
+        return self.drives.iloc[drive_start:drive_end]
+
+    def get_drive(self, game_id, drive_no):
+        # drive_no is the 1-based position of the drive in the game, as in its label
+        _, _, drive_start, drive_end = self.games[game_id]
+        if not 1 <= drive_no <= drive_end - drive_start:
+            raise IndexError(f"{game_id} has no drive {drive_no}")
+        start, end = self._drive_rows[drive_start + drive_no - 1]
+        return self.plays.iloc[start:end]
@@ -0,0 +1,231 @@
+from argparse import ArgumentParser
+import os
+
+import numpy as np
+import pandas as pd
+
+from comeback_store import get_table_dir, get_table_partition_path, load_table
+from drive_viewer.drive_index import SeasonIndex
+from drive_viewer.season_store import SEASON_STORE, get_store_path, load_checksums, load_season, save_checksums
+from pbp_parsing import QUARTER_SECONDS, clock_to_seconds, seconds_to_clock
+
+SUMMARY_TABLE = "drive_summaries"
+SUMMARY_VERSION = 2  # bump whenever summarize_drives changes so stored summaries are recomputed
+# plays that are not snaps of the drive's offense: they do not count as plays or field position, and neither
+# do two-point tries (run or pass plays with two_point_attempt == 1)
+NON_SNAP_PLAY_TYPES = ["kickoff", "extra_point"]
+DRIVE_RESULTS = [
+    "Touchdown", "Field goal", "Missed field goal", "Punt", "Interception", "Fumble", "Safety", "Downs",
+    "End of half", "Other",
+]
+
+def _elapsed(qtr, time):
+    # seconds since kickoff at a quarter and clock; OT is treated as a 15-minute quarter, so only differences
+    # within the same half are meaningful
+    return (np.asarray(qtr, dtype=float) - 1) * QUARTER_SECONDS + QUARTER_SECONDS - clock_to_seconds(time).to_numpy()
+
+def summarize_drives(season_index):
+    # one row per drive of the season, in the order of season_index.drives (week, game, drive), from a single
+    # groupby over every charted play of the season:
+    #   plays: snaps, without kickoffs, tries or nullified plays
+    #   start/end_yardline_100: yards from the opponent's goal line at the first snap and after the last one
+    #   yards: net yards, i.e. the change in field position from the first snap to the end of the last one.
+    #     Accepted penalties before the last snap are included; penalty yards on the last snap are not, since
+    #     PLAY_COLS does not say which team was penalized
+    #   yards_gained, penalty_yards: yards gained on the counted snaps, and accepted penalty yards (against
+    #     either team) on the drive's snaps
+    #   time_of_possession: seconds from the drive's first play until the next drive of the half starts
+    #   result, points: how the drive ended and what the offense scored on it (including the try)
+    #   game_winning: the drive gave the eventual winner the lead it kept until the end of the game
+    plays, drives = season_index.plays, season_index.drives
+    drive_key = np.repeat(np.arange(len(drives)), (drives["end"] - drives["start"]).to_numpy())
+
+    play_type = plays["play_type"].astype(object)
+    snap = ~play_type.isin(NON_SNAP_PLAY_TYPES) & (plays["two_point_attempt"] != 1)
+    counted = snap & (play_type != "no_play")
+    yardline = plays["yardline_100"].astype(float).where(snap)
+    grouped = pd.DataFrame({
+        "counted": counted,
+        "snap_yardline": yardline,
+        "snap_yrdln": plays["yrdln"].where(snap),
+        "snap_end": (yardline - plays["yards_gained"].astype(float).where(counted, 0)).clip(0, 100).where(snap),
+        "snap_down": plays["down"].astype(float).where(snap),
+        "snap_gained": plays["yards_gained"].astype(float).where(counted),
+        "snap_penalty_yards": plays["penalty_yards"].astype(float).where(snap & (plays["penalty"] == 1)),
+        "touchdown": plays["touchdown"],
+        "interception": plays["interception"],
+        "fumble_lost": plays["fumble_lost"],
+        "safety": plays["safety"],
+        "punt": play_type == "punt",
+        "field_goal_attempt": plays["field_goal_attempt"],
+        "field_goal_made": plays["field_goal_result"].astype(object) == "made",
+        "elapsed": _elapsed(plays["qtr"], plays["time"]),
+        "total_home_score": plays["total_home_score"],
+        "total_away_score": plays["total_away_score"],
+    }).groupby(drive_key, sort=True).agg(
+        plays=("counted", "sum"),
+        start_yardline_100=("snap_yardline", "first"),
+        start_yrdln=("snap_yrdln", "first"),
+        end_yardline_100=("snap_end", "last"),
+        last_down=("snap_down", "last"),
+        yards_gained=("snap_gained", "sum"),
+        penalty_yards=("snap_penalty_yards", "sum"),
+        touchdown=("touchdown", "max"),
+        interception=("interception", "max"),
+        fumble_lost=("fumble_lost", "max"),
+        safety=("safety", "max"),
+        punt=("punt", "max"),
+        field_goal_attempt=("field_goal_attempt", "max"),
+        field_goal_made=("field_goal_made", "max"),
+        last_elapsed=("elapsed", "last"),
+        home_after=("total_home_score", "last"),
+        away_after=("total_away_score", "last"),
+    )
+
+    first_plays = plays.iloc[drives["start"].to_numpy()].reset_index(drop=True)
+    game = drives["game_id"]
+    is_home = (first_plays["posteam"].astype(object) == first_plays["home_team"].astype(object)).to_numpy()
+
+    # time of possession runs until the next drive of the same half starts; the last drive of a half ends
+    # with its last play, whose own duration is unknown
+    start_elapsed = _elapsed(drives["qtr"], drives["time"])
+    half = np.minimum((drives["qtr"].to_numpy() + 1) // 2, 3)
+    next_elapsed = pd.Series(start_elapsed).groupby(game).shift(-1).to_numpy()
+    next_half = pd.Series(half).groupby(game).shift(-1).to_numpy()
+    last_of_half = next_half != half
+    end_elapsed = np.where(last_of_half, grouped["last_elapsed"].to_numpy(), next_elapsed)
+
+    # scores before a drive are the scores after the previous drive of the game
+    home_after, away_after = grouped["home_after"].astype(float), grouped["away_after"].astype(float)
+    home_before = home_after.groupby(game.to_numpy()).shift(1).fillna(0)
+    away_before = away_after.groupby(game.to_numpy()).shift(1).fillna(0)
+    points = np.where(is_home, home_after - home_before, away_after - away_before)
+
+    # leads from the eventual winner's side; a game-winning drive is the winner's go-ahead drive after which
+    # the lead never went back to a tie or deficit
+    home_won = (first_plays["home_score"] > first_plays["away_score"]).to_numpy()
+    winner_sign = np.where(home_won, 1, -1) * (first_plays["home_score"] != first_plays["away_score"]).to_numpy()
+    lead_before = winner_sign * (home_before - away_before).to_numpy()
+    lead_after = pd.Series(winner_sign * (home_after - away_after).to_numpy())
+    lead_kept = lead_after[::-1].groupby(game[::-1].to_numpy()).cummin()[::-1].to_numpy()
+    game_winning = (is_home == home_won) & (winner_sign != 0) & (lead_before <= 0) & (lead_kept > 0)
+
+    result = np.select([
+        grouped["interception"].to_numpy() > 0,
+        grouped["fumble_lost"].to_numpy() > 0,
+        (grouped["touchdown"].to_numpy() > 0) & (points >= 6),
+        grouped["field_goal_made"].to_numpy(),
+        grouped["field_goal_attempt"].to_numpy() > 0,
+        grouped["punt"].to_numpy(),
+        grouped["safety"].to_numpy() > 0,
+        grouped["last_down"].to_numpy() == 4,
+        last_of_half,
+    ], ["Interception", "Fumble", "Touchdown", "Field goal", "Missed field goal", "Punt", "Safety", "Downs", "End of half"],
+        "Other")
+
+    return pd.DataFrame({
+        "season": first_plays["season"].to_numpy(),
+        "week": first_plays["week"].to_numpy(),
+        "game_id": game.to_numpy(),
+        "drive": drives["drive"].to_numpy(),
+        "drive_no": drives.groupby("game_id", sort=False).cumcount().to_numpy() + 1,
+        "posteam": first_plays["posteam"].astype(object).to_numpy(),
+        "defteam": first_plays["defteam"].astype(object).to_numpy(),
+        "qtr": drives["qtr"].to_numpy(),
+        "time": drives["time"].to_numpy(),
+        "plays": grouped["plays"].to_numpy().astype(int),
+        "yards": (grouped["start_yardline_100"] - grouped["end_yardline_100"]).to_numpy(),
+        "yards_gained": grouped["yards_gained"].to_numpy(),
+        "penalty_yards": grouped["penalty_yards"].to_numpy(),
+        "start_yrdln": grouped["start_yrdln"].to_numpy(),
+        "start_yardline_100": grouped["start_yardline_100"].to_numpy(),
+        "end_yardline_100": grouped["end_yardline_100"].to_numpy(),
+        "time_of_possession": np.maximum(end_elapsed - start_elapsed, 0),
+        "result": result,
+        "points": points.astype(int),
+        "game_winning": game_winning,
+    })
+
+def get_summary_labels(summaries, labels):
+    # "<drive label>: Touchdown, 8 plays, 75 yds, 4:12" for selectors; labels as in SeasonIndex.drives
+    summaries = summaries.reset_index(drop=True)
+    yards = summaries["yards"].round().astype("Int64").astype(str).where(summaries["yards"].notnull(), "-")
+    top = seconds_to_clock(summaries["time_of_possession"]).fillna("-")
+    plays = summaries["plays"].astype(str) + np.where(summaries["plays"] == 1, " play", " plays")
+    labels = pd.Series(labels).astype(str).reset_index(drop=True)
+    return (labels + ": " + summaries["result"].astype(str) + ", " + plays + ", " + yards + " yds, " + top).tolist()
+
+def write_drive_summaries(store, season, summaries):
+    # partitioned like the comeback tables, so load_table() can read any range of seasons at once
+    os.makedirs(get_table_dir(store, SUMMARY_TABLE), exist_ok=True)
+    path = get_table_partition_path(store, SUMMARY_TABLE, season)
+    summaries.assign(year=np.int16(season)).to_parquet(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+    return path
+
+def is_summary_current(season, store=SEASON_STORE):
+    # summaries record the checksum of the stored season they were computed from and the summary version
+    entry = load_checksums(store).get(str(season), {})
+    file_sha256 = entry.get("file", {}).get("sha256")
+    return (
+        file_sha256 is not None and os.path.exists(get_table_partition_path(store, SUMMARY_TABLE, season))
+        and entry.get(SUMMARY_TABLE) == {"version": SUMMARY_VERSION, "file_sha256": file_sha256}
+    )
+
+def load_drive_summaries(season, store=SEASON_STORE, season_index=None):
+    # rows line up with SeasonIndex.drives, so SeasonIndex.games' drive offsets index them by game. Summaries
+    # are computed (from season_index when it was already built) and stored if missing or outdated
+    if is_summary_current(season, store):
+        return pd.read_parquet(get_table_partition_path(store, SUMMARY_TABLE, season)).drop(columns="year")
+    season_index = SeasonIndex(load_season(season, store=store)) if season_index is None else season_index
+    summaries = summarize_drives(season_index)
+    write_drive_summaries(store, season, summaries)
+    # without a checksum entry for the season (e.g. after checksums.json was reset) the summaries cannot be
+    # tied to a stored season, so they are not recorded and get recomputed next time
+    checksums = load_checksums(store)
+    entry = checksums.get(str(season), {})
+    if "file" in entry:
+        entry[SUMMARY_TABLE] = {"version": SUMMARY_VERSION, "file_sha256": entry["file"]["sha256"]}
+        save_checksums(store, checksums)
+    return summaries
+
+def query_drives(store=SEASON_STORE, min_year=None, max_year=None, min_yards=None, results=None, game_winning=None,
+                 teams=None, columns=None):
+    # cross-game search over the stored summaries only; no play-by-play is loaded
+    df = load_table(store, SUMMARY_TABLE, min_year, max_year, columns)
+    mask = pd.Series(True, index=df.index)
+    if min_yards is not None:
+        mask &= df["yards"] >= min_yards
+    if results is not None:
+        mask &= df["result"].isin(results)
+    if game_winning is not None:
+        mask &= df["game_winning"] == game_winning
+    if teams is not None:
+        mask &= df["posteam"].isin(teams)
+    return df[mask].reset_index(drop=True)
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Summarize every drive of stored seasons and search the summaries.")
+    parser.add_argument("--begin-year", type=int, default=1999)
+    parser.add_argument("--end-year", type=int, default=2023)
+    parser.add_argument("--store", default=SEASON_STORE)
+    parser.add_argument("--build", action="store_true", help="(re)compute summaries of stored seasons first")
+    parser.add_argument("--min-yards", type=float, default=None, help="net yards, penalties included")
+    parser.add_argument("--results", choices=DRIVE_RESULTS, nargs="+", default=None)
+    parser.add_argument("--game-winning", action="store_true")
+    parser.add_argument("--teams", nargs="+", default=None)
+    parser.add_argument("--output", default=None, help="write matching drives to this CSV instead of printing them")
+    args = parser.parse_args()
+
+    if args.build:
+        for season in range(args.begin_year, args.end_year + 1):
+            if os.path.exists(get_store_path(args.store, season)):
+                print("Summarized", len(load_drive_summaries(season, args.store)), "drives from", season)
+    drives = query_drives(
+        args.store, args.begin_year, args.end_year, args.min_yards, args.results, True if args.game_winning else None, args.teams,
+    )
+    if args.output is not None:
+        drives.to_csv(args.output, index=False)
+        print("Wrote", len(drives), "drives to", args.output)
+    else:
+        print(drives.to_string(index=False))
@@ -0,0 +1,61 @@
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import functools
+import os
+
+from tqdm.auto import tqdm
+
+from drive_viewer.annotate_utils import get_play_annotations
+from drive_viewer.drive_chart import RENDER_MODES, create_game_charts, get_chart_path
+from drive_viewer.drive_index import SeasonIndex
+from drive_viewer.season_store import SEASON_STORE, load_season
+
+CHART_FORMATS = ["json", "html"]
+
+@functools.lru_cache(maxsize=1)
+def _get_season_index(season, store):
+    # each worker builds the season's index once and reuses it for all the games it is given
+    return SeasonIndex(load_season(season, store=store, offline=True))
+
+def export_game(season, game_id, chart_dir, formats=("json",), store=SEASON_STORE, render_mode="traces"):
+    # writes every drive of the game to <chart_dir>/<season>/<game_id>/drive_<n>.<format>; returns the drive count
+    game_df = _get_season_index(season, store).get_game(game_id)
+    charts = create_game_charts(game_df, get_play_annotations(game_df), render_mode)
+    os.makedirs(os.path.dirname(get_chart_path(chart_dir, season, game_id, 1)), exist_ok=True)
+    for drive_no, (_, fig) in enumerate(charts, 1):
+        if "json" in formats:
+            fig.write_json(get_chart_path(chart_dir, season, game_id, drive_no, "json"))
+        if "html" in formats:
+            fig.write_html(get_chart_path(chart_dir, season, game_id, drive_no, "html"), include_plotlyjs="cdn")
+    return len(charts)
+
+def export_season(season, chart_dir, formats=("json",), n_workers=1, store=SEASON_STORE, game_ids=None, render_mode="traces"):
+    # games are independent, so they are spread over a process pool; the season is stored (downloaded if
+    # needed) up front so that workers only ever read the local store
+    load_season(season, store=store)
+    game_ids = list(_get_season_index(season, store).games) if game_ids is None else game_ids
+    n_drives = 0
+    if n_workers > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = [executor.submit(export_game, season, game_id, chart_dir, formats, store, render_mode) for game_id in game_ids]
+            for future in tqdm(as_completed(futures), total=len(futures), desc=str(season)):
+                n_drives += future.result()
+    else:
+        for game_id in tqdm(game_ids, desc=str(season)):
+            n_drives += export_game(season, game_id, chart_dir, formats, store, render_mode)
+    return n_drives
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Pregenerate drive charts for every drive of every game in a season.")
+    parser.add_argument("seasons", type=int, nargs="+")
+    parser.add_argument("--chart-dir", default="./data/drive_charts")
+    parser.add_argument("--store", default=SEASON_STORE)
+    parser.add_argument("--formats", choices=CHART_FORMATS, nargs="+", default=["json"])
+    parser.add_argument("--games", nargs="+", default=None, help="only these game_ids (default: every game of the season)")
+    parser.add_argument("--render-mode", choices=RENDER_MODES, default="traces")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    for season in args.seasons:
+        n_drives = export_season(season, args.chart_dir, args.formats, args.workers, args.store, args.games, args.render_mode)
+        print("Exported", n_drives, "drive charts from", season, "to", os.path.join(args.chart_dir, str(season)))
@@ -0,0 +1,82 @@
+import copy
+
+import numpy as np
+import plotly.graph_objects as go
+
+from drive_viewer.constants.dimensions import DRAW_SCALE, DRIVE_PADDING, PLAY_HEIGHT, TEXT_MARGIN, X_N_NUMBERS
+from drive_viewer.constants.football import FIELD_COLOR
+from drive_viewer.draw_utils import add_end_zone_text, draw_numbers, fill_end_zone, get_yard_line_trace, get_yard_lines
+from keyed_cache import keyed_cache
+
+FIELD_TEMPLATE_CACHE_SIZE = 256  # team pairings x render modes
+
+def get_drive_index(n_plays):
+    # y of each play of a drive, first play at the top
+    return PLAY_HEIGHT * np.arange(n_plays, 0, -1) + PLAY_HEIGHT
+
+def get_field_extent(n_plays):
+    # every y coordinate of the field that depends on the drive length
+    drive_index = get_drive_index(max(n_plays, 1))
+    return dict(
+        bottom=drive_index[-1] - DRIVE_PADDING / 2,
+        top=drive_index[0] + DRIVE_PADDING / 2,
+        line_bottom=drive_index[-1] - DRIVE_PADDING,
+        line_top=drive_index[0] + DRIVE_PADDING,
+        text=max((drive_index[0] + drive_index[-1]) / 2, 2 * PLAY_HEIGHT),
+        height=max(6, n_plays) * PLAY_HEIGHT * DRAW_SCALE,
+    )
+
+@keyed_cache(maxsize=FIELD_TEMPLATE_CACHE_SIZE)
+def get_field_template(home_team, away_team, render_mode="traces"):
+    # the part of a drive chart that does not depend on the plays: yard numbers, end zones and their team
+    # names, yard lines, axes and sizing. Built (and validated) once per (home, away) pairing for a one-play
+    # drive and kept as plotly JSON; get_field() stretches a copy to each drive. Shared, so do not mutate
+    drive_index = get_drive_index(1)
+    extent = get_field_extent(1)
+    bottom, top = extent["bottom"], extent["top"]
+    data = [draw_numbers(bottom + TEXT_MARGIN), draw_numbers(top - TEXT_MARGIN)] + fill_end_zone(home_team, away_team, [bottom, top])
+    if render_mode == "traces":
+        data.append(get_yard_line_trace(drive_index))
+    layout = go.Layout(
+        autosize=False,
+        width=120 * DRAW_SCALE,
+        height=extent["height"],
+        xaxis1=dict(range=[0, 120], autorange=False, tickmode='array', tickvals=np.arange(10, 111, 5).tolist(), showticklabels=False, fixedrange=True),
+        yaxis1=dict(range=[bottom, top], showticklabels=False, showgrid=False, fixedrange=True),
+        plot_bgcolor=FIELD_COLOR,
+        shapes=get_yard_lines(drive_index) if render_mode == "shapes" else [],
+        showlegend=False,
+        hoverlabel=dict(
+            bgcolor="white",
+            font_size=14,
+            font_family="Helvetica",
+            font_color="black",
+            align="left",
+        )
+    )
+    template = go.Figure(data, layout=layout)
+    add_end_zone_text(template, home_team, away_team, extent["text"])
+    return template.to_plotly_json()
+
+def get_field(home_team, away_team, n_plays, render_mode="traces"):
+    # a copy of the pairing's template with the drive's vertical extent applied, as figure JSON that the
+    # chart can add its plays to: the traces of get_field_template() in order, then layout sizes and shapes
+    field = copy.deepcopy(get_field_template(home_team, away_team, render_mode))
+    extent = get_field_extent(n_plays)
+    bottom_numbers, top_numbers, *end_zones = field["data"][:4]
+    # one yard number and one yard line every 10 yards
+    bottom_numbers["y"] = [extent["bottom"] + TEXT_MARGIN] * X_N_NUMBERS
+    top_numbers["y"] = [extent["top"] - TEXT_MARGIN] * X_N_NUMBERS
+    for end_zone in end_zones:
+        end_zone["y"] = [extent["bottom"], extent["top"], extent["top"], extent["bottom"], extent["bottom"]]
+    if render_mode == "traces":
+        yard_lines = field["data"][4]
+        yard_lines["y"] = [extent["line_top"], extent["line_bottom"], None] * X_N_NUMBERS
+    layout = field["layout"]
+    for yard_line in layout.get("shapes", []):
+        yard_line["y0"], yard_line["y1"] = extent["line_top"], extent["line_bottom"]
+    for end_zone_text in layout.get("annotations", []):
+        end_zone_text["y"] = extent["text"]
+    layout["height"] = extent["height"]
+    layout["yaxis"]["range"] = [extent["bottom"], extent["top"]]
+    return field
@@ -0,0 +1,133 @@
+from argparse import ArgumentParser
+import hashlib
+import json
+import os
+import tempfile
+from urllib.request import urlopen
+
+import pandas as pd
+
+from comeback_store import file_signature
+from drive_viewer.constants.columns import GAME_COLS, PLAY_COLS
+from pbp_reader import read_play_by_play
+
+# the source may be the nflverse release URL or a local directory mirroring it (play_by_play_{season}.csv.gz)
+PBP_SOURCE = os.environ.get("PBP_SOURCE", "https://github.com/nflverse/nflverse-data/releases/download/pbp")
+SEASON_STORE = os.environ.get("SEASON_STORE", "./data/drive_viewer")
+OFFLINE = os.environ.get("SEASON_STORE_OFFLINE", "") not in ("", "0")
+STORE_COLS = GAME_COLS + PLAY_COLS
+CHECKSUM_FILE = "checksums.json"
+COPY_CHUNK_SIZE = 1 << 20
+
+def get_source_path(source, season):
+    filename = f"play_by_play_{season}.csv.gz"
+    if source.startswith(("http://", "https://")):
+        return f"{source.rstrip('/')}/{filename}"
+    return os.path.join(source, filename)
+
+def get_store_path(store, season):
+    return os.path.join(store, f"play_by_play_{season}.parquet")
+
+def load_checksums(store):
+    path = os.path.join(store, CHECKSUM_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_checksums(store, checksums):
+    path = os.path.join(store, CHECKSUM_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(checksums, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+def _download(source_path, dest):
+    # copies the raw (still gzipped) file and returns its sha256
+    sha = hashlib.sha256()
+    raw = urlopen(source_path) if source_path.startswith(("http://", "https://")) else open(source_path, "rb")
+    with raw, open(dest, "wb") as f:
+        for chunk in iter(lambda: raw.read(COPY_CHUNK_SIZE), b""):
+            sha.update(chunk)
+            f.write(chunk)
+    return sha.hexdigest()
+
+def fetch_season(season, source=PBP_SOURCE, store=SEASON_STORE, expected_sha256=None):
+    # downloads one season, keeps only STORE_COLS and stores it as typed parquet; the checksums of both the
+    # source file and the stored file are recorded so later loads can be validated
+    os.makedirs(store, exist_ok=True)
+    source_path = get_source_path(source, season)
+    with tempfile.TemporaryDirectory(dir=store) as tmp_dir:
+        download_path = os.path.join(tmp_dir, os.path.basename(source_path))
+        source_sha256 = _download(source_path, download_path)
+        if expected_sha256 is not None and source_sha256 != expected_sha256:
+            raise ValueError(f"{source_path} has sha256 {source_sha256}, expected {expected_sha256}")
+        df, _ = read_play_by_play(download_path, STORE_COLS, verbose=False)
+    path = get_store_path(store, season)
+    df.to_parquet(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+    checksums = load_checksums(store)
+    checksums[str(season)] = {
+        "source": source_path,
+        "source_sha256": source_sha256,
+        "columns": STORE_COLS,
+        "rows": len(df),
+        "file": file_signature(path),
+    }
+    save_checksums(store, checksums)
+    return df
+
+def is_season_stored(season, store=SEASON_STORE, validate=True, rehash=False, expected_sha256=None):
+    # stored with the current columns (from the pinned source file, if expected_sha256 is given) and, with
+    # validate, unchanged since it was written; the file is only re-hashed when its size or mtime differ from the
+    # recorded ones, or always with rehash
+    entry = load_checksums(store).get(str(season))
+    path = get_store_path(store, season)
+    if entry is None or entry["columns"] != STORE_COLS or not os.path.exists(path):
+        return False
+    if expected_sha256 is not None and entry["source_sha256"] != expected_sha256:
+        return False
+    return not validate or file_signature(path, previous=None if rehash else entry["file"])["sha256"] == entry["file"]["sha256"]
+
+def load_season(season, source=PBP_SOURCE, store=SEASON_STORE, offline=OFFLINE, validate=True, expected_sha256=None):
+    # reads the season from the local store, downloading it first if it is missing, outdated, corrupted or not
+    # from the pinned source file; in offline mode nothing is downloaded and a missing season is an error
+    if is_season_stored(season, store, validate, expected_sha256=expected_sha256):
+        return pd.read_parquet(get_store_path(store, season))
+    if offline:
+        raise FileNotFoundError(f"season {season} is not (validly) stored in {store} and offline mode is on")
+    return fetch_season(season, source, store, expected_sha256)
+
+def parse_pinned_checksums(pins):
+    # SEASON=SHA256 pairs from the command line
+    pinned = {}
+    for pin in pins:
+        season, sep, sha256 = pin.partition("=")
+        if not sep or not season.isdigit() or not sha256:
+            raise ValueError(f"expected SEASON=SHA256, got {pin!r}")
+        pinned[int(season)] = sha256.lower()
+    return pinned
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Download play-by-play seasons into the drive viewer's local season store.")
+    parser.add_argument("--begin-year", type=int, default=1999)
+    parser.add_argument("--end-year", type=int, default=2023)
+    parser.add_argument("--source", default=PBP_SOURCE, help="base URL or local mirror directory")
+    parser.add_argument("--store", default=SEASON_STORE)
+    parser.add_argument("--force", action="store_true", help="re-download seasons that are already stored")
+    parser.add_argument("--verify", action="store_true", help="only check stored seasons against their checksums")
+    parser.add_argument("--expected-sha256", action="append", default=[], metavar="SEASON=SHA256",
+                        help="pin a season's source file to a sha256 (repeatable)")
+    args = parser.parse_args()
+    try:
+        pinned = parse_pinned_checksums(args.expected_sha256)
+    except ValueError as e:
+        parser.error(str(e))
+
+    for season in range(args.begin_year, args.end_year + 1):
+        expected_sha256 = pinned.get(season)
+        if args.verify:
+            stored = is_season_stored(season, args.store, rehash=True, expected_sha256=expected_sha256)
+            print(season, "ok" if stored else "missing or invalid")
+        elif args.force or not is_season_stored(season, args.store, expected_sha256=expected_sha256):
+            df = fetch_season(season, args.source, args.store, expected_sha256)
+            print("Stored", len(df), "plays from", season, "in", get_store_path(args.store, season))
@@ -1,16 +1,40 @@
+from argparse import ArgumentParser
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 import os
+import time
 
+import numpy as np
 import pandas as pd
 from tqdm.auto import tqdm
-tqdm.pandas()
+
+from comeback_store import (
+    LOOKUP_ROW_GROUP_SIZE,
+    file_signature,
+    is_season_current,
+    load_manifest,
+    load_season_partition,
+    save_manifest,
+    save_season_partition,
+    write_data_version,
+    write_offset_index,
+    write_partitioned_table,
+)
+from extraction_metrics import find_slow_seasons, measure, record_stage, write_report
+from pbp_parsing import QUARTER_SECONDS, clock_to_seconds
+from pbp_reader import concat_frames, iter_game_batches, iter_play_by_play, read_play_by_play
 
 GAMEINFO_COLS = ["home_team", "away_team", "game_date", "week", "season_type", "qtr", "desc", "time", "game_seconds_remaining", "wp", "def_wp"]
 SCORE_COLS = ["total_home_score", "total_away_score", "home_score", "away_score", "posteam", "defteam", "posteam_score", "defteam_score", "posteam_score_post", "defteam_score_post"]
 WIN_LOSE_COLS = ["winning_team", "losing_team", "winning_score", "losing_score"]
 DEFICIT_COLS = ["deficit_end", "deficit_end_qtr", "deficit_posteam_score", "deficit_defteam_score"]
 DEFICIT_SOURCE_COLS = ["time", "qtr", "posteam_score", "defteam_score"]
+COMEBACK_COLS = ["max_future_deficit"] + DEFICIT_COLS + ["deficit_end_seconds", "score_team_at_deficit", "score_team_wp_at_deficit"] + WIN_LOSE_COLS
 
-QUARTER_SECONDS = 15 * 60
+EXTRACTION_VERSION = 1  # bump whenever the extraction logic changes so existing season partitions are rebuilt
+PEAK_MEMORY_FACTOR = 4  # rough peak RSS of one season relative to its uncompressed CSV size
+STREAM_CHUNK_SIZE = 1 << 22  # decoded bytes per chunk in streaming mode
+STREAM_BATCH_ROWS = 1 << 15  # plays of complete games extracted together in streaming mode
+REPORT_FILE = "extraction_report.json"
 
 def get_scoring_summaries(group):
     scoring_plays = group.loc[(group[["total_home_score", "total_away_score"]] - group[["total_home_score", "total_away_score"]].shift(1)).sum(axis=1) > 0]
@@ -33,7 +57,7 @@ def get_best_comebacks(group):
 
     # create deficit metadata
     worst_deficits.loc[:, DEFICIT_COLS] = worst_deficits.loc[:, DEFICIT_SOURCE_COLS].shift(-1).values
-    remain_seconds = worst_deficits.loc[:, "deficit_end"].apply(lambda x: None if pd.isnull(x) else int(x.split(":")[0]) * 60 + int(x.split(":")[1]))
+    remain_seconds = clock_to_seconds(worst_deficits.loc[:, "deficit_end"])
     worst_deficits.loc[:, "deficit_end_seconds"] = worst_deficits["deficit_end_qtr"] * QUARTER_SECONDS - remain_seconds
     worst_deficits.loc[:, "score_team_at_deficit"] = worst_deficits["posteam"].where(worst_deficits["posteam_score_post"] - worst_deficits["posteam_score"] > 0, worst_deficits["defteam"])  # team that reduced the worst deficit so far
     worst_deficits.loc[:, "score_team_wp_at_deficit"] = worst_deficits["wp"].where(worst_deficits["score_team_at_deficit"] == worst_deficits["posteam"], worst_deficits["def_wp"]).shift(-1)  # pre-scoring WP at worst deficit
@@ -43,32 +67,276 @@ def get_best_comebacks(group):
     worst_deficits.loc[:, WIN_LOSE_COLS] = worst_deficits.loc[:, win_lose_source_cols].values
     return worst_deficits
 
-def main(data_path="./data", begin_year=1999, end_year=2023):
-    dfs = []
-    scoring_summaries = []
+def _game_starts(game_ids):
+    # boolean mask marking the first play of each game; plays must already be contiguous per game
+    game_ids = np.asarray(game_ids)
+    is_start = np.ones(len(game_ids), dtype=bool)
+    is_start[1:] = game_ids[1:] != game_ids[:-1]
+    return is_start
+
+def _shift_within(values, is_start, periods):
+    # segmented equivalent of groupby(...).shift(periods) for contiguous groups
+    shifted = pd.Series(values).shift(periods)
+    if periods > 0:
+        shifted[is_start] = np.nan
+    else:
+        is_end = np.roll(is_start, -1)
+        is_end[-1:] = True
+        shifted[is_end] = np.nan
+    return shifted
+
+def get_season_comebacks(df):
+    # vectorized get_best_comebacks over every game in df at once; rows come out in the same order as
+    # df.groupby("game_id").apply(get_best_comebacks).reset_index(drop=True)
+    return extract_season(df)[0]
+
+def extract_season(df):
+    # comebacks and scoring summaries from one pass over df; every game with a scoring play has at least one
+    # comeback row, so the scoring plays found along the way are exactly the scoring summaries of comeback games
+    df = df.sort_values("game_id", kind="stable").reset_index(drop=True)
+    if df.empty:
+        return df.reindex(columns=list(df.columns) + COMEBACK_COLS), df
+    is_start = _game_starts(df["game_id"])
+    game_no = np.cumsum(is_start) - 1
+
+    # filter down to scoring plays only
+    score_delta = sum(_shift_within(df[col].to_numpy(), is_start, 1).rsub(df[col].to_numpy()).fillna(0) for col in ["total_home_score", "total_away_score"])
+    scoring_mask = score_delta.to_numpy() > 0
+
+    # get game result info, broadcast from the first play of each game
+    home_wins = (df["home_score"].to_numpy() > df["away_score"].to_numpy())[is_start][game_no]
+    winner_total = df["total_home_score"].where(home_wins, df["total_away_score"])
+    loser_total = df["total_away_score"].where(home_wins, df["total_home_score"])
+
+    plays = df.loc[scoring_mask].reset_index(drop=True)
+    summary = plays.copy()
+    home_wins = home_wins[scoring_mask]
+    game_no = game_no[scoring_mask]
+    is_start = _game_starts(game_no)
+
+    # filter down to "worst deficits" only (segmented reversed cummax)
+    margin = (loser_total[scoring_mask] - winner_total[scoring_mask]).reset_index(drop=True)
+    max_future_deficit = margin[::-1].groupby(game_no[::-1]).cummax()[::-1]
+    step = (max_future_deficit - _shift_within(max_future_deficit.to_numpy(), is_start, 1)).fillna(-0.01)
+    keep = step.to_numpy() < 0
+    plays = plays.loc[keep].reset_index(drop=True)
+    plays["max_future_deficit"] = max_future_deficit[keep].clip(0, None).to_numpy()
+    home_wins = home_wins[keep]
+    is_start = _game_starts(game_no[keep])
+
+    # create deficit metadata
+    for col, source_col in zip(DEFICIT_COLS, DEFICIT_SOURCE_COLS):
+        plays[col] = _shift_within(plays[source_col].to_numpy(dtype=object), is_start, -1).infer_objects()
+    plays["deficit_end_seconds"] = plays["deficit_end_qtr"] * QUARTER_SECONDS - clock_to_seconds(plays["deficit_end"])
+    plays["score_team_at_deficit"] = plays["posteam"].where(plays["posteam_score_post"] - plays["posteam_score"] > 0, plays["defteam"])
+    score_team_wp = plays["wp"].where(plays["score_team_at_deficit"] == plays["posteam"], plays["def_wp"])
+    plays["score_team_wp_at_deficit"] = _shift_within(score_team_wp.to_numpy(), is_start, -1)
+
+    # get winner info (for tooltip)
+    plays["winning_team"] = plays["home_team"].where(home_wins, plays["away_team"])
+    plays["losing_team"] = plays["away_team"].where(home_wins, plays["home_team"])
+    plays["winning_score"] = plays["home_score"].where(home_wins, plays["away_score"])
+    plays["losing_score"] = plays["away_score"].where(home_wins, plays["home_score"])
+    return plays, summary
+
+def get_season_file(data_path, year):
+    return os.path.join(data_path, f"play_by_play_{year}.csv.gz")
+
+def estimate_season_memory(data_file):
+    # gzip stores the uncompressed size (mod 2**32) in its last four bytes
+    with open(data_file, "rb") as f:
+        f.seek(-4, os.SEEK_END)
+        uncompressed_size = int.from_bytes(f.read(4), "little")
+    return uncompressed_size * PEAK_MEMORY_FACTOR
+
+def process_season(data_path, year, stages=None):
+    stages = {} if stages is None else stages
+    print("Processing", year, "play-by-play data...")
+    with record_stage(stages, "read") as stage:
+        df, read_stats = read_play_by_play(get_season_file(data_path, year), ["play_id", "game_id"] + GAMEINFO_COLS + SCORE_COLS)
+        # decode covers disk/network reads and gzip; the rest of the stage is CSV parsing
+        stage.update(rows=len(df), bytes_decoded=read_stats["bytes_decoded"], decode_seconds=read_stats["decode_seconds"])
+    with record_stage(stages, "filter", rows=len(df)):
+        filtered_df = df.loc[df["home_score"] != df["away_score"]]
+    with record_stage(stages, "extract", rows=len(filtered_df)):
+        return extract_season(filtered_df)
+
+def _extract_buffer(games, comebacks, summaries):
+    # extracts frames of complete games at once and appends the results; every game lies in one buffer,
+    # so the concatenated results only differ from a single extract_season call in their game order
+    df = concat_frames(games)
+    filtered_df = df.loc[df["home_score"] != df["away_score"]]
+    if filtered_df.empty:
+        return
+    buffer_comebacks, buffer_summary = extract_season(filtered_df)
+    comebacks.append(buffer_comebacks)
+    summaries.append(buffer_summary)
+
+def process_season_streaming(data_path, year, stages=None, chunk_size=STREAM_CHUNK_SIZE, batch_rows=STREAM_BATCH_ROWS):
+    # same output as process_season, but only one chunk and about batch_rows plays of complete games are held
+    # in memory at a time
+    stages = {} if stages is None else stages
+    print("Streaming", year, "play-by-play data...")
+    chunks = iter_play_by_play(get_season_file(data_path, year), ["play_id", "game_id"] + GAMEINFO_COLS + SCORE_COLS, chunk_size=chunk_size)
+    game_comebacks = []
+    game_summaries = []
+    # reading and extraction are interleaved, so they are recorded as one stage. Finished games are buffered
+    # and extracted together, since extract_season's vectorized work has a fixed cost per call
+    with record_stage(stages, "stream", rows=0) as stage:
+        buffer = []
+        buffer_rows = 0
+        for games in tqdm(iter_game_batches(chunks), desc=str(year), unit="chunk"):
+            stage["rows"] += len(games)
+            buffer.append(games)
+            buffer_rows += len(games)
+            if buffer_rows >= batch_rows:
+                _extract_buffer(buffer, game_comebacks, game_summaries)
+                buffer = []
+                buffer_rows = 0
+        if buffer:
+            _extract_buffer(buffer, game_comebacks, game_summaries)
+    with record_stage(stages, "concat", rows=sum(map(len, game_comebacks)) + sum(map(len, game_summaries))):
+        # games are emitted in file order; the batch path orders them by game_id
+        comebacks = concat_frames(game_comebacks).sort_values("game_id", kind="stable").reset_index(drop=True)
+        summary = concat_frames(game_summaries).sort_values("game_id", kind="stable").reset_index(drop=True)
+    return comebacks, summary
+
+def run_season(data_path, year, streaming=False, profile_dir=None, trace_memory=False):
+    # returns ((comebacks, summary), metrics); top-level so it can run in a worker process
+    profile_path = None if profile_dir is None else os.path.join(profile_dir, f"season_{year}.prof")
+    process = process_season_streaming if streaming else process_season
+    return measure(process, data_path, year, profile_path=profile_path, trace_memory=trace_memory)
+
+def process_seasons_parallel(data_path, years, n_workers, max_memory=None, streaming=False, profile_dir=None, trace_memory=False):
+    # seasons are independent, so each runs in its own process; a season is only started once the
+    # estimated peak memory of all in-flight seasons fits under max_memory (one season always runs)
+    results = {}
+    pending = list(years)
+    running = {}
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        while pending or running:
+            while pending and len(running) < n_workers:
+                year = pending[0]
+                required = STREAM_CHUNK_SIZE * PEAK_MEMORY_FACTOR if streaming else estimate_season_memory(get_season_file(data_path, year))
+                in_use = sum(memory for _, memory in running.values())
+                if running and max_memory is not None and in_use + required > max_memory:
+                    break
+                future = executor.submit(run_season, data_path, year, streaming=streaming, profile_dir=profile_dir, trace_memory=trace_memory)
+                running[future] = (year, required)
+                pending.pop(0)
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                year, _ = running.pop(future)
+                results[year] = future.result()
+    return [results[year] for year in years]
+
+def main(data_path="./data", begin_year=1999, end_year=2023, n_workers=1, max_memory=None, force=False, output_format="csv", streaming=False,
+         report_path=None, profile_dir=None, trace_memory=False):
+    years = list(range(begin_year, end_year + 1))
     print("Reading data from", begin_year, "to", end_year)
-    for year in range(begin_year, end_year + 1):
-        print("Processing", year, "play-by-play data...")
-        data_file = os.path.join(data_path, f"play_by_play_{year}.csv.gz")
-        df = pd.read_csv(data_file, low_memory=False)
-        filtered_df = df.loc[df["home_score"] != df["away_score"], ["play_id", "game_id"] + GAMEINFO_COLS + SCORE_COLS]
-        game_groups = filtered_df.groupby("game_id")
-        comebacks = game_groups.progress_apply(get_best_comebacks).reset_index(drop=True)
-        summary = filtered_df[filtered_df["game_id"].isin(comebacks["game_id"])] \
-            .groupby("game_id") \
-            .progress_apply(get_scoring_summaries) \
-            .reset_index(drop=True)
-        dfs.append(comebacks)
-        scoring_summaries.append(summary)
-    comeback_df = pd.concat(dfs, keys=list(range(begin_year, end_year + 1)), names=["year"], axis=0)
-    comeback_path = os.path.join(data_path, "comebacks.csv")
-    comeback_df.to_csv(comeback_path)
-    print("Saved comeback data to", comeback_path)
-
-    scoring_df = pd.concat(scoring_summaries, keys=list(range(begin_year, end_year + 1)), names=["year"], axis=0)
-    scoring_path = os.path.join(data_path, "scoring_summaries.csv")
-    scoring_df.to_csv(scoring_path)
-    print("Saved scoring summary data to", scoring_path)
+    report_path = os.path.join(data_path, REPORT_FILE) if report_path is None else report_path
+    if profile_dir is not None:
+        os.makedirs(profile_dir, exist_ok=True)
+    stages = {}
+    run_start = time.time()
+
+    # only seasons whose input changed since the last run (or that were never extracted) are reprocessed
+    with record_stage(stages, "hash_inputs", rows=len(years)):
+        manifest = load_manifest(data_path, EXTRACTION_VERSION)
+        signatures = {}
+        for year in years:
+            previous = manifest["seasons"].get(str(year), {}).get("input")
+            signatures[year] = file_signature(get_season_file(data_path, year), previous=previous)
+        stale_years = [year for year in years if force or not is_season_current(data_path, manifest, year, signatures[year])]
+    print("Reprocessing", len(stale_years), "of", len(years), "seasons:", stale_years)
+
+    with record_stage(stages, "process_seasons", rows=len(stale_years)):
+        if n_workers > 1 and len(stale_years) > 1:
+            stale_runs = process_seasons_parallel(data_path, stale_years, n_workers, max_memory=max_memory, streaming=streaming, profile_dir=profile_dir, trace_memory=trace_memory)
+        else:
+            stale_runs = [run_season(data_path, year, streaming=streaming, profile_dir=profile_dir, trace_memory=trace_memory) for year in stale_years]
+    stale_results = [result for result, _ in stale_runs]
+    season_metrics = {str(year): metrics for year, (_, metrics) in zip(stale_years, stale_runs)}
+
+    with record_stage(stages, "save_partitions", rows=len(stale_years)):
+        for year, (comebacks, summary) in zip(stale_years, stale_results):
+            save_season_partition(data_path, year, comebacks, summary)
+        for year in years:
+            # also refreshes stat info so the next run can skip hashing unchanged files
+            manifest["seasons"][str(year)] = {"input": signatures[year]}
+        save_manifest(data_path, manifest)
+
+    with record_stage(stages, "load_partitions", rows=len(years) - len(stale_years)):
+        fresh = dict(zip(stale_years, stale_results))
+        season_results = [fresh[year] if year in fresh else load_season_partition(data_path, year) for year in years]
+        dfs, scoring_summaries = zip(*season_results)
+
+    with record_stage(stages, "write_output", rows=sum(map(len, dfs)) + sum(map(len, scoring_summaries))):
+        if output_format == "parquet":
+            # only reprocessed seasons are rewritten; scoring summaries are looked up one game at a time, so their
+            # row groups are kept small
+            for name, tables, row_group_size in [("comebacks", dfs, None), ("scoring_summaries", scoring_summaries, LOOKUP_ROW_GROUP_SIZE)]:
+                table_dir = write_partitioned_table(data_path, name, tables, years, row_group_size, stale_years)
+                print("Saved", name.replace("_", " "), "data to", table_dir)
+        else:
+            comeback_df = pd.concat(dfs, keys=years, names=["year"], axis=0)
+            comeback_path = os.path.join(data_path, "comebacks.csv")
+            comeback_df.to_csv(comeback_path + ".tmp")
+            os.replace(comeback_path + ".tmp", comeback_path)
+            print("Saved comeback data to", comeback_path)
+
+            scoring_df = pd.concat(scoring_summaries, keys=years, names=["year"], axis=0)
+            scoring_path = os.path.join(data_path, "scoring_summaries.csv")
+            scoring_df.to_csv(scoring_path + ".tmp")
+            os.replace(scoring_path + ".tmp", scoring_path)
+            print("Saved scoring summary data to", scoring_path)
+        # seasons are sorted by game_id, so each game's scoring plays are one contiguous run of rows
+        index_path = write_offset_index(data_path, "scoring_summaries", scoring_summaries, years)
+        print("Saved scoring summary index to", index_path)
+        # every table is replaced atomically and the stamp goes last, so running apps reload a complete extraction
+        data_version = write_data_version(data_path, manifest, years, output_format)
+        print("Data version", data_version)
+
+    slow_seasons = find_slow_seasons(season_metrics)
+    if slow_seasons:
+        print("Seasons processed unusually slowly:", slow_seasons)
+    write_report(report_path, {
+        "extraction_version": EXTRACTION_VERSION,
+        "started": run_start,
+        "years": years,
+        "data_version": data_version,
+        "reprocessed": stale_years,
+        "options": {"n_workers": n_workers, "max_memory": max_memory, "force": force, "output_format": output_format, "streaming": streaming},
+        "stages": stages,
+        "seasons": season_metrics,
+        "slow_seasons": slow_seasons,
+    })
+    print("Saved extraction report to", report_path)
 
 if __name__ == '__main__':
-    main()
+    parser = ArgumentParser(description="Extract comeback and scoring summary data from nflverse play-by-play files.")
+    parser.add_argument("--data-path", default="./data")
+    parser.add_argument("--begin-year", type=int, default=1999)
+    parser.add_argument("--end-year", type=int, default=2023)
+    parser.add_argument("--workers", type=int, default=1, help="number of seasons to process in parallel")
+    parser.add_argument("--max-memory-gb", type=float, default=None, help="throttle parallel seasons to fit this estimated peak memory")
+    parser.add_argument("--force", action="store_true", help="reprocess every season even if its input is unchanged")
+    parser.add_argument("--streaming", action="store_true", help="read each season in chunks and extract game by game to bound memory")
+    parser.add_argument("--report", default=None, help=f"where to write the JSON metrics report (default: <data-path>/{REPORT_FILE})")
+    parser.add_argument("--profile-dir", default=None, help="dump a cProfile of each reprocessed season into this directory")
+    parser.add_argument("--trace-memory", action="store_true", help="record per-stage peak allocations with tracemalloc (slower)")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv", help="flat CSV files or year-partitioned parquet tables")
+    args = parser.parse_args()
+    main(
+        data_path=args.data_path,
+        begin_year=args.begin_year,
+        end_year=args.end_year,
+        n_workers=args.workers,
+        max_memory=None if args.max_memory_gb is None else args.max_memory_gb * 1024 ** 3,
+        force=args.force,
+        output_format=args.format,
+        streaming=args.streaming,
+        report_path=args.report,
+        profile_dir=args.profile_dir,
+        trace_memory=args.trace_memory,
+    )
@@ -0,0 +1,114 @@
+from contextlib import contextmanager
+import cProfile
+import json
+import os
+import resource
+import statistics
+import time
+import tracemalloc
+
+SLOW_SEASON_FACTOR = 2  # a season is flagged when its rows/s is this many times below the median
+
+def _max_rss_mb():
+    # high-water mark of the current process; ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _peak_rss_mb():
+    # VmHWM: peak resident set size since the last _reset_peak_rss(), or since the process started
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    return _max_rss_mb()
+
+def _reset_peak_rss():
+    # resets VmHWM to the current RSS (Linux >= 4.0); False where that is not possible
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+_open_stages = []  # entries of the enclosing stages being recorded, outermost first
+
+def current_rss_mb():
+    # resident set size right now; falls back to the high-water mark where /proc is unavailable
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        return _max_rss_mb()
+
+@contextmanager
+def record_stage(stages, name, rows=None):
+    # records wall time, CPU time, rows and memory of the enclosed block into stages[name]; the yielded
+    # dict can be updated inside the block, e.g. with rows that are only known after reading
+    entry = {"rows": rows}
+    # the peak so far is carried over to the enclosing stages before it is reset for this one; without a
+    # resettable peak only the process's lifetime high-water mark is available, reported as max_rss_mb
+    peak_rss = _peak_rss_mb()
+    for open_entry in _open_stages:
+        open_entry["peak_rss_mb"] = max(open_entry.get("peak_rss_mb", 0), peak_rss)
+    resettable = _reset_peak_rss()
+    _open_stages.append(entry)
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield entry
+    finally:
+        entry["wall_seconds"] = time.perf_counter() - wall_start
+        entry["cpu_seconds"] = time.process_time() - cpu_start
+        if entry["rows"] is not None and entry["wall_seconds"] > 0:
+            entry["rows_per_second"] = entry["rows"] / entry["wall_seconds"]
+        _open_stages.pop()
+        if resettable:
+            entry["peak_rss_mb"] = max(entry.get("peak_rss_mb", 0), _peak_rss_mb())
+        else:
+            entry.pop("peak_rss_mb", None)
+            entry["max_rss_mb"] = _max_rss_mb()
+        if tracing:
+            entry["peak_traced_mb"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        stages[name] = entry
+
+def measure(fn, *args, profile_path=None, trace_memory=False):
+    # runs fn(*args, stages), where fn records its own stages, and returns (result, metrics) with the run's
+    # totals; with profile_path the run is also profiled and its cProfile stats dumped there
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    stages = {}
+    totals = {}
+    with record_stage(totals, "total") as total:
+        if profile_path is None:
+            result = fn(*args, stages)
+        else:
+            profiler = cProfile.Profile()
+            result = profiler.runcall(fn, *args, stages)
+            profiler.dump_stats(profile_path)
+        total["rows"] = next(iter(stages.values()))["rows"] if stages else None
+    metrics = {"stages": stages, **totals["total"]}
+    if "peak_traced_mb" in metrics:
+        # each stage resets the traced peak, so the run's peak is the largest stage peak
+        metrics["peak_traced_mb"] = max([metrics["peak_traced_mb"]] + [stage["peak_traced_mb"] for stage in stages.values()])
+    if profile_path is not None:
+        metrics["profile"] = profile_path
+    return result, metrics
+
+def find_slow_seasons(seasons, factor=SLOW_SEASON_FACTOR):
+    throughput = {year: metrics["rows_per_second"] for year, metrics in seasons.items() if metrics.get("rows_per_second")}
+    if not throughput:
+        return []
+    median = statistics.median(throughput.values())
+    return sorted(year for year, rows_per_second in throughput.items() if rows_per_second * factor < median)
+
+def write_report(path, report):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
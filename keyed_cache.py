@@ -0,0 +1,108 @@
+from collections import OrderedDict
+import functools
+import inspect
+import threading
+
+_CACHES = {}
+_DATA_VERSION = {"current": None, "written": None}
+_DATA_VERSION_LOCK = threading.Lock()
+
+class KeyedLRUCache:
+    # size-bounded LRU cache keyed on small hashable identifiers; values are shared, not copied, so callers
+    # must not mutate them
+
+    def __init__(self, name, maxsize):
+        self.name = name
+        self.maxsize = maxsize
+        self.versioned = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+        # computed outside the lock so a slow miss does not block other sessions' hits
+        value = compute()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def discard(self, predicate):
+        # drops the entries whose key matches predicate, leaving the rest warm
+        with self._lock:
+            stale = [key for key in self._entries if predicate(key)]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
+
+def keyed_cache(maxsize, versioned=False):
+    # like functools.lru_cache, but shared across Streamlit sessions and registered for cache_stats();
+    # the decorated function's arguments are the cache key, so they should be identifiers, not DataFrames.
+    # versioned caches take a data version as their first argument and are pruned by set_data_version()
+    def decorator(fn):
+        # Streamlit re-executes the app script on every rerun, so an existing cache of the same name is reused
+        name = f"{fn.__module__}.{fn.__qualname__}"
+        cache = _CACHES.setdefault(name, KeyedLRUCache(name, maxsize))
+        cache.versioned = versioned
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            # defaults are filled in, so f(a) and f(a, <default>) share an entry
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return cache.get_or_compute(bound.args, lambda: fn(*bound.args))
+
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+def set_data_version(version, written=None):
+    # drops entries built from any other data version from the versioned caches; unversioned caches (e.g. plot
+    # layouts) stay warm. A no-op while the version is unchanged, so it can be called on every rerun. With
+    # `written` (when the version was produced), the version only moves forward: a session that read an older
+    # stamp while data was being re-extracted cannot evict the newer version's entries
+    with _DATA_VERSION_LOCK:
+        current_written = _DATA_VERSION["written"]
+        if written is not None and current_written is not None and written < current_written:
+            return 0
+        if written is not None:
+            _DATA_VERSION["written"] = written
+        if _DATA_VERSION["current"] == version:
+            return 0
+        _DATA_VERSION["current"] = version
+        return sum(
+            cache.discard(lambda key: key[0] != version)
+            for cache in list(_CACHES.values()) if cache.versioned
+        )
+
+def cache_stats():
+    return {name: cache.stats() for name, cache in _CACHES.items()}
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+QUARTER_SECONDS = 15 * 60
+GAME_SECONDS = 4 * QUARTER_SECONDS  # no OT
+MIDFIELD = 50
+
+# all parsers and formatters take and return whole Series; missing inputs come out as NaN/None
+
+def clock_to_seconds(clock):
+    # "mm:ss" -> seconds left in the quarter
+    parts = pd.Series(clock).astype(object).str.split(":", n=1, expand=True).reindex(columns=[0, 1])
+    return parts[0].astype(float) * 60 + parts[1].astype(float)
+
+def seconds_to_clock(seconds):
+    # seconds left in the quarter -> "m:ss"
+    seconds = pd.Series(seconds).round().astype("Int64")
+    clock = (seconds // 60).astype(str) + ":" + (seconds % 60).astype(str).str.zfill(2)
+    return clock.where(seconds.notnull(), None).astype(object)
+
+def format_game_clock(qtr, clock):
+    # quarter and "mm:ss" clock -> "Q# mm:ss"
+    qtr = pd.Series(qtr).astype("Int64")
+    clock = pd.Series(clock, index=qtr.index).astype(object)
+    game_clock = "Q" + qtr.astype(str) + " " + clock.astype(str)
+    return game_clock.where(qtr.notnull() & clock.notnull(), None).astype(object)
+
+def elapsed_to_game_clock(elapsed):
+    # seconds elapsed since kickoff -> "Q# m:ss", or "End Reg." once regulation is over
+    elapsed = pd.Series(elapsed).astype("Int64")
+    game_clock = format_game_clock(elapsed // QUARTER_SECONDS + 1, seconds_to_clock(QUARTER_SECONDS - elapsed % QUARTER_SECONDS))
+    return game_clock.mask(elapsed >= GAME_SECONDS, "End Reg.")
+
+def yrdln_to_numeric(yrdln, home):
+    # "TEAM NN" -> 0-100 field position from the home team's goal line (home team moves right);
+    # "50" and "MID 50" are midfield. home may be a scalar or a Series aligned with yrdln
+    yrdln = pd.Series(yrdln).astype(object)
+    parts = yrdln.str.rsplit(" ", n=1, expand=True).reindex(columns=[0, 1])
+    has_side = parts[1].notnull()
+    side = parts[0].where(has_side)
+    number = parts[1].where(has_side, parts[0]).astype(float)
+    home = pd.Series(home, index=yrdln.index).astype(object) if np.ndim(home) else home
+    return number.where((side == home) | (number == MIDFIELD), 100 - number)
+
+def numeric_to_yrdln(num, home, away):
+    # inverse of yrdln_to_numeric; home and away may be scalars or Series aligned with num
+    num = pd.Series(num).round().astype("Int64")
+    home = pd.Series(home, index=num.index).astype(object)
+    away = pd.Series(away, index=num.index).astype(object)
+    home_half = (num < MIDFIELD).fillna(False)
+    yrdln = home.where(home_half, away) + " " + num.where(home_half, 100 - num).astype(str)
+    yrdln = yrdln.mask(num == MIDFIELD, str(MIDFIELD))
+    return yrdln.where(num.notnull(), None).astype(object)
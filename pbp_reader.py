@@ -0,0 +1,256 @@
+import gzip
+import io
+import time
+from urllib.request import urlopen
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+except ImportError:
+    pa = None
+    pa_csv = None
+
+TEAM_COLS = ["home_team", "away_team", "posteam", "defteam", "side_of_field", "timeout_team", "score_team_at_deficit", "winning_team", "losing_team"]
+
+# integer columns are parsed as floats and downcast to the int dtype only when they have no missing values
+PBP_DTYPES = {
+    "play_id": "int32",
+    "game_id": "object",
+    "home_team": "category",
+    "away_team": "category",
+    "season_type": "category",
+    "season": "int16",
+    "start_time": "object",
+    "stadium": "object",
+    "weather": "object",
+    "week": "int8",
+    "game_date": "object",
+    "home_score": "int16",
+    "away_score": "int16",
+    "posteam": "category",
+    "posteam_type": "category",
+    "defteam": "category",
+    "side_of_field": "category",
+    "yardline_100": "float32",
+    "total_home_score": "int16",
+    "total_away_score": "int16",
+    "posteam_score": "int16",
+    "defteam_score": "int16",
+    "posteam_score_post": "int16",
+    "defteam_score_post": "int16",
+    "drive": "float32",
+    "sp": "int8",
+    "qtr": "int8",
+    "down": "float32",
+    "goal_to_go": "int8",
+    "time": "object",
+    "end_clock_time": "object",
+    "end_yard_line": "object",
+    "yrdln": "object",
+    "ydstogo": "int8",
+    "ydsnet": "float32",
+    "desc": "object",
+    "play_type": "category",
+    "yards_gained": "float32",
+    "first_down": "float32",
+    "timeout": "float32",
+    "timeout_team": "category",
+    "posteam_timeouts_remaining": "float32",
+    "defteam_timeouts_remaining": "float32",
+    "game_seconds_remaining": "int16",
+    "wp": "float32",
+    "def_wp": "float32",
+    "home_wp": "float32",
+    "away_wp": "float32",
+    "penalty": "float32",
+    "penalty_yards": "float32",
+    "safety": "float32",
+    "fumble_lost": "float32",
+    "sack": "float32",
+    "touchdown": "float32",
+    "interception": "float32",
+    "extra_point_attempt": "float32",
+    "two_point_attempt": "float32",
+    "field_goal_attempt": "float32",
+    "field_goal_result": "category",
+}
+PARSER_ENGINE = "pyarrow" if pa_csv is not None else "c"
+
+class _CountingReader(io.RawIOBase):
+    # counts decoded bytes and the time spent producing them (network, disk and gzip decode)
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.bytes_read = 0
+        self.read_seconds = 0.
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        start = time.perf_counter()
+        data = self.raw.read(len(buffer))
+        self.read_seconds += time.perf_counter() - start
+        n = len(data)
+        buffer[:n] = data
+        self.bytes_read += n
+        return n
+
+def _open_source(source):
+    raw = urlopen(source) if source.startswith(("http://", "https://")) else open(source, "rb")
+    return gzip.GzipFile(fileobj=raw) if source.endswith(".gz") else raw
+
+def _parse_dtype(dtype):
+    # dtype the parser should produce before integer downcasting
+    return "float64" if dtype.startswith("int") else dtype
+
+def _arrow_type(dtype):
+    if dtype == "category":
+        return pa.dictionary(pa.int32(), pa.string())
+    if dtype == "object":
+        return pa.string()
+    return pa.type_for_alias(_parse_dtype(dtype))
+
+def _parse_csv(stream, columns):
+    dtypes = {col: PBP_DTYPES[col] for col in columns if col in PBP_DTYPES}
+    if PARSER_ENGINE == "pyarrow":
+        convert_options = pa_csv.ConvertOptions(
+            include_columns=columns,
+            strings_can_be_null=True,
+            column_types={col: _arrow_type(dtype) for col, dtype in dtypes.items()},
+        )
+        return pa_csv.read_csv(stream, convert_options=convert_options).to_pandas()
+    return pd.read_csv(stream, usecols=columns, dtype={col: _parse_dtype(dtype) for col, dtype in dtypes.items()}, low_memory=False)
+
+def _iter_csv(stream, columns, chunk_size):
+    dtypes = {col: PBP_DTYPES[col] for col in columns if col in PBP_DTYPES}
+    if PARSER_ENGINE == "pyarrow":
+        convert_options = pa_csv.ConvertOptions(
+            include_columns=columns,
+            strings_can_be_null=True,
+            column_types={col: _arrow_type(dtype) for col, dtype in dtypes.items()},
+        )
+        for batch in pa_csv.open_csv(stream, read_options=pa_csv.ReadOptions(block_size=chunk_size), convert_options=convert_options):
+            yield batch.to_pandas()
+        return
+    # the C parser chunks by rows; assume ~1 KB per play-by-play row so both engines read similar amounts
+    yield from pd.read_csv(stream, usecols=columns, dtype={col: _parse_dtype(dtype) for col, dtype in dtypes.items()}, chunksize=max(chunk_size >> 10, 1))
+
+def _compact(df):
+    return compact_frame(df, PBP_DTYPES)
+
+def compact_frame(df, dtypes):
+    # applies a dtype map like PBP_DTYPES; categories are sorted and columns not in the map are left alone
+    for col in df.columns:
+        dtype = dtypes.get(col, "")
+        if dtype.startswith("int") and df[col].notnull().all():
+            df[col] = df[col].astype(dtype)
+        elif dtype.startswith("int") or dtype.startswith("float"):
+            df[col] = df[col].astype("float32" if dtype.startswith("int") else dtype)
+        elif dtype == "category":
+            values = df[col].cat.categories if isinstance(df[col].dtype, pd.CategoricalDtype) else df[col].dropna().unique()
+            df[col] = df[col].astype(pd.CategoricalDtype(sorted(values)))
+
+    return _share_team_categories(df)
+
+def _share_team_categories(df):
+    # team columns share one set of categories so they can be compared and combined with each other
+    team_cols = [col for col in TEAM_COLS if col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype)]
+    if team_cols:
+        teams = sorted(set().union(*(df[col].cat.categories for col in team_cols)))
+        for col in team_cols:
+            df[col] = df[col].cat.set_categories(teams)
+    return df
+
+def concat_frames(parts):
+    # pd.concat falls back to object for categoricals whose categories differ between parts
+    df = pd.concat(parts, ignore_index=True)
+    for col in parts[0].columns:
+        if isinstance(parts[0][col].dtype, pd.CategoricalDtype) and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+    return _share_team_categories(df)
+
+def read_play_by_play(source, columns, verbose=True):
+    # source may be a local path or an http(s) URL; ".gz" sources are decompressed on the fly
+    start = time.perf_counter()
+    with _open_source(source) as raw:
+        counter = _CountingReader(raw)
+        df = _parse_csv(io.BufferedReader(counter), columns)
+    df = _compact(df[columns])
+    elapsed = time.perf_counter() - start
+    stats = {
+        "source": source,
+        "engine": PARSER_ENGINE,
+        "rows": len(df),
+        "bytes_decoded": counter.bytes_read,
+        "decode_seconds": counter.read_seconds,
+        "seconds": elapsed,
+        "rows_per_second": len(df) / elapsed if elapsed > 0 else float("inf"),
+    }
+    if verbose:
+        print(f"Read {stats['rows']:,} rows ({stats['bytes_decoded'] / 1e6:.1f} MB decoded) from {source} "
+              f"in {elapsed:.2f}s ({stats['rows_per_second']:,.0f} rows/s, {PARSER_ENGINE} parser)")
+    return df, stats
+
+def iter_play_by_play(source, columns, chunk_size=1 << 22):
+    # like read_play_by_play, but yields typed chunks of roughly chunk_size decoded bytes instead of one frame
+    with _open_source(source) as raw:
+        for chunk in _iter_csv(io.BufferedReader(raw), columns, chunk_size):
+            yield _compact(chunk[columns])
+
+def iter_games(chunks, key="game_id"):
+    # regroups a stream of chunks into one frame per game; plays of a game must be contiguous in the source,
+    # so a game is complete as soon as a play from a different game arrives
+    seen = set()
+    pending = []
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        ids = chunk[key].to_numpy()
+        is_start = np.ones(len(ids), dtype=bool)
+        is_start[1:] = ids[1:] != ids[:-1]
+        starts = np.flatnonzero(is_start)
+        bounds = list(starts) + [len(ids)]
+        for begin, end in zip(bounds[:-1], bounds[1:]):
+            piece = chunk.iloc[begin:end]
+            game_id = ids[begin]
+            if pending and pending[0][key].iloc[0] != game_id:
+                yield concat_frames(pending)
+                pending = []
+            if not pending:
+                if game_id in seen:
+                    raise ValueError(f"plays for {game_id} are not contiguous in the source")
+                seen.add(game_id)
+            pending.append(piece)
+    if pending:
+        yield concat_frames(pending)
+
+def iter_game_batches(chunks, key="game_id"):
+    # like iter_games, but yields every game completed by a chunk as one frame instead of one frame per game;
+    # a game is never split across frames
+    seen = set()
+    pending = None  # plays of the last game seen, which may continue in the next chunk
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        ids = chunk[key].to_numpy()
+        is_start = np.ones(len(ids), dtype=bool)
+        is_start[1:] = ids[1:] != ids[:-1]
+        starts = np.flatnonzero(is_start)
+        continues = pending is not None and pending[key].iloc[0] == ids[0]
+        for game_id in ids[starts[1:] if continues else starts]:
+            if game_id in seen:
+                raise ValueError(f"plays for {game_id} are not contiguous in the source")
+            seen.add(game_id)
+        if continues and len(starts) == 1:
+            pending = concat_frames([pending, chunk])
+            continue
+        done = [part for part in [pending, chunk.iloc[:starts[-1]]] if part is not None and not part.empty]
+        if done:
+            yield concat_frames(done)
+        pending = chunk.iloc[starts[-1]:]
+    if pending is not None:
+        yield concat_frames([pending])
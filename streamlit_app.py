@@ -1,12 +1,25 @@
 import pandas as pd
-import plotly.express as px
+import plotly.graph_objects as go
 import streamlit as st
 
+from comeback_query import ComebackCounts, filter_comebacks, get_comeback_level, get_comeback_rate
+from comeback_store import (
+    build_season_offset_index,
+    is_table_partitioned,
+    load_offset_index,
+    load_table,
+    read_data_stamp,
+    read_table_rows,
+)
+from extraction_metrics import current_rss_mb
+from keyed_cache import cache_stats, keyed_cache, set_data_version
+from pbp_parsing import GAME_SECONDS, QUARTER_SECONDS, elapsed_to_game_clock, format_game_clock
+
+DATA_PATH = "./data"
 N_SEASONS = 25
 N_GAMES = 16 * 17 + 13
 MIN_POINTS = 17
-QUARTER_SECONDS = 15 * 60
-GAME_SECONDS = 4 * QUARTER_SECONDS  # assume no OT for now
+MAX_POINTS = 35
 MIN_YEAR = 1999
 MAX_YEAR = 2023
 SUMMARY_COLS = [
@@ -23,20 +36,82 @@ SUMMARY_COLS = [
     "home_score",
     "away_score",
 ]
+COMEBACK_DATA_COLS = [
+    "year",
+    "game_id",
+    "game_date",
+    "week",
+    "season_type",
+    "max_future_deficit",
+    "deficit_end",
+    "deficit_end_qtr",
+    "deficit_end_seconds",
+    "deficit_posteam_score",
+    "deficit_defteam_score",
+    "score_team_wp_at_deficit",
+    "winning_team",
+    "losing_team",
+    "winning_score",
+    "losing_score",
+]
+CUSTOM_DATA_COLS = [
+    "game_id",
+    "deficit_end_qtr",
+    "deficit_end",
+    "game_date",
+    "week",
+    "deficit_posteam_score",
+    "deficit_defteam_score",
+    "winning_team",
+    "losing_team",
+    "winning_score",
+    "losing_score",
+    "score_team_wp_at_deficit",
+]
+COLOR_MODES = {
+    "Deficit": {"color": "max_future_deficit", "colorscale": "reds"},
+    "Win probability": {"color": "score_team_wp_at_deficit", "colorscale": "blues"},
+}
 DEFICIT_MAX_COLOR = 35
 DEFICIT_MIN_COLOR = -DEFICIT_MAX_COLOR
 
-@st.cache_data
-def get_comeback_data():
-    return pd.read_csv("./data/comebacks.csv")
-
-
-@st.cache_data
-def get_scoring_summaries():
-    return pd.read_csv("./data/scoring_summaries.csv")
-
-@st.cache_data
-def get_game_id_mapping(series):
+# everything derived from the extracted tables is cached per data version (see refresh_data)
+
+@keyed_cache(maxsize=16, versioned=True)
+def get_comeback_data(data_version, min_year=MIN_YEAR, max_year=MAX_YEAR, columns=tuple(COMEBACK_DATA_COLS)):
+    # only the partitions for [min_year, max_year] and the requested columns are read; shared, so do not mutate
+    return load_table(DATA_PATH, "comebacks", min_year, max_year, list(columns))
+
+@keyed_cache(maxsize=2, versioned=True)
+def get_comeback_counts(data_version):
+    # built once per data version; slider counts are then answered without scanning the comeback rows
+    return ComebackCounts(get_comeback_data(data_version), range(MIN_POINTS, MAX_POINTS + 1))
+
+@keyed_cache(maxsize=2, versioned=True)
+def get_scoring_index(data_version):
+    # game_id -> (year, start, end) rows within the game's season; only game_id and year are read if no index was extracted
+    index = load_offset_index(DATA_PATH, "scoring_summaries", MIN_YEAR, MAX_YEAR, rebase=False)
+    if index is None:
+        index = build_season_offset_index(load_table(DATA_PATH, "scoring_summaries", MIN_YEAR, MAX_YEAR, ["game_id", "year"]))
+    return index
+
+@keyed_cache(maxsize=1, versioned=True)
+def get_scoring_seasons(data_version):
+    # CSV extractions cannot be read by row range, so their scoring summaries are loaded once per data version
+    df = load_table(DATA_PATH, "scoring_summaries", MIN_YEAR, MAX_YEAR, SUMMARY_COLS + ["year"])
+    return {year: season_df.reset_index(drop=True) for year, season_df in df.groupby("year", sort=True)}
+
+@keyed_cache(maxsize=16, versioned=True)
+def get_scoring_slice(data_version, game_id):
+    # parquet scoring summaries are never loaded as a whole; only the selected game's rows are read
+    year, start, end = get_scoring_index(data_version)[game_id]
+    if not is_table_partitioned(DATA_PATH, "scoring_summaries"):
+        return get_scoring_seasons(data_version)[year].iloc[start:end][SUMMARY_COLS].reset_index(drop=True)
+    return read_table_rows(DATA_PATH, "scoring_summaries", year, start, end, SUMMARY_COLS)
+
+@keyed_cache(maxsize=2, versioned=True)
+def get_game_id_mapping(data_version):
+    series = get_comeback_data(data_version).loc[lambda df: df["max_future_deficit"] >= MIN_POINTS, "game_id"]
     # game_ids are formatted {year}_{week}_{home_team}_{away_team}
     def reformat_id(row):
         year, week, home, away = row.split("_")
@@ -59,34 +134,20 @@ Multiple deficits may appear per game; if you recovered from being down by, say,
 **Disclaimer:** This is a *draft*/fun side project. There may be unforeseen bugs or issues with the data.
 """)
 
-def get_comeback_level(rate):
-    if rate > 16:
-        return "Come on, we see these like, once a week."
-    elif rate > 8:
-        return "Yeah, could happen."
-    elif rate > 4:
-        return "There's a few every season..."
-    elif rate > 2:
-        return "There's a *very* few every season..."
-    elif rate > 1:
-        return "There's like, one or two every season."
-    elif rate > 0.5:
-        return "Maybe next season..."
-    elif rate > 0.2:
-        return "If successful, this game will get its own Wikipedia page."
-    elif rate > 0:
-        return "Might as well get some lottery tickets..."
-    else:
-        return "UNPRECEDENTED!"
+def refresh_data(data_version, written):
+    # on a new extraction, the new version's counts are built before older versions' entries are dropped, so
+    # sessions are never left without warm data; a no-op while the version is unchanged or older than the current one
+    get_comeback_counts(data_version)
+    set_data_version(data_version, written)
+
+def get_memory_footprint(data_version):
+    return {
+        "process_rss_mb": current_rss_mb(),
+        "comebacks_mb": get_comeback_data(data_version).memory_usage(deep=True).sum() / 2 ** 20,
+    }
 
 def get_game_time_str(game_time):
-    if game_time >= GAME_SECONDS:
-        return "End Reg."
-    q = game_time // QUARTER_SECONDS + 1
-    q_sec_remain = QUARTER_SECONDS - game_time % QUARTER_SECONDS
-    min_remain = q_sec_remain // 60
-    sec_remain = q_sec_remain % 60
-    return f"Q{q} {min_remain}:{sec_remain:02}"
+    return elapsed_to_game_clock([game_time]).iloc[0]
 
 @st.cache_data
 def get_hovertemplate():
@@ -98,32 +159,72 @@ def get_hovertemplate():
     ]
     return '<br>'.join(hover_lines)
 
-@st.cache_data
-def get_color(key):
-    colorby_dict = {
-        "Deficit": {"color": "max_future_deficit", "color_continuous_scale": "reds"},
-        "Win probability": {"color": "score_team_wp_at_deficit", "color_continuous_scale": "blues"}
-    }
-    return colorby_dict[key]
+@keyed_cache(maxsize=len(COLOR_MODES))
+def get_figure_layout(colorby):
+    # everything but the points (axes, tick labels, quarter lines, color axis) is built once per plotting mode
+    tickvals = list(range(0, GAME_SECONDS + 1, QUARTER_SECONDS // 3))
+    return go.Layout(
+        title=f"NFL Comebacks by more than two scores ({MIN_POINTS}+ pts.), 1999-2023",
+        xaxis=dict(
+            title="Game time",
+            tickmode='array',
+            tickvals=tickvals,
+            ticktext=elapsed_to_game_clock(tickvals).tolist(),
+            constrain='domain',
+        ),
+        yaxis=dict(title="Winning team maximum deficit"),
+        coloraxis=dict(colorscale=COLOR_MODES[colorby]["colorscale"], colorbar=dict(title=colorby)),
+        shapes=[
+            dict(type="line", xref="x", yref="paper", x0=i, x1=i, y0=0, y1=1, line=dict(dash="dash", color="white"))
+            for i in range(QUARTER_SECONDS, GAME_SECONDS + 1, QUARTER_SECONDS)
+        ],
+    )
 
-@st.cache_data
-def create_summary(df):
+def get_season_comebacks(data_version, min_year, max_year):
+    # parquet partitions are read by season range; a CSV table is parsed once per data version and filtered
+    if is_table_partitioned(DATA_PATH, "comebacks"):
+        return get_comeback_data(data_version, min_year, max_year)
+    df = get_comeback_data(data_version)
+    return df[df["year"].between(min_year, max_year)]
+
+@keyed_cache(maxsize=64, versioned=True)
+def get_comeback_figure(data_version, colorby, deficit, game_time, include_postseason, min_year, max_year, max_wp):
+    # WebGL scatter over the cached layout; only the points depend on the filters
+    deficit_df = filter_comebacks(get_season_comebacks(data_version, min_year, max_year), deficit, game_time, include_postseason)
+    deficit_df = deficit_df[deficit_df["score_team_wp_at_deficit"] <= max_wp]
+    fig = go.Figure(
+        go.Scattergl(
+            x=deficit_df["deficit_end_seconds"].to_numpy(),
+            y=deficit_df["max_future_deficit"].to_numpy(),
+            customdata=deficit_df[CUSTOM_DATA_COLS].to_numpy(),
+            mode="markers",
+            marker=dict(color=deficit_df[COLOR_MODES[colorby]["color"]].to_numpy(), coloraxis="coloraxis"),
+            hovertemplate=get_hovertemplate(),
+        ),
+        layout=get_figure_layout(colorby),
+    )
+    fig.update_xaxes(range=(game_time, GAME_SECONDS))
+    return fig
+
+@keyed_cache(maxsize=256, versioned=True)
+def create_summary(data_version, game_id):
+    df = get_scoring_slice(data_version, game_id)
     first = df.iloc[0]
     winning_score = max(first["home_score"], first["away_score"])
     losing_score = min(first["home_score"], first["away_score"])
     winning_team = "total_home_score" if df["total_home_score"].iloc[-1] == winning_score else "total_away_score"
     losing_team = "total_away_score" if df["total_home_score"].iloc[-1] == winning_score else "total_home_score"
     return pd.DataFrame({
-        "Time": "Q" + df["qtr"].astype(str) + " " + df["time"],
+        "Time": format_game_clock(df["qtr"], df["time"]),
         "Play description": df["desc"].str.wrap(30),
         df["home_team"].iloc[0]: df["total_home_score"],
         df["away_team"].iloc[0]: df["total_away_score"],
         "Winner deficit": df[losing_team] - df[winning_team]
     })
 
-@st.cache_data
-def get_summary_header(df):
-    df = df.iloc[0]
+@keyed_cache(maxsize=256, versioned=True)
+def get_summary_header(data_version, game_id):
+    df = get_scoring_slice(data_version, game_id).iloc[0]
     winning_score = max(df["home_score"], df["away_score"])
     losing_score = min(df["home_score"], df["away_score"])
     winning_team = df["home_team"] if winning_score == df["home_score"] else df["away_team"]
@@ -133,29 +234,25 @@ def get_summary_header(df):
     **{df["game_date"]} (Week {df["week"]}): {winning_team} def. {losing_team} {winning_score}-{losing_score}**
     """
 
-df = get_comeback_data()
-scoring_df = get_scoring_summaries()
+data_version, data_written = read_data_stamp(DATA_PATH)
+refresh_data(data_version, data_written)
 
 st.divider()
 st.markdown("### Plot settings")
 include_postseason = st.checkbox("Include postseason games", value=True)
-deficit = st.slider("Hope level (minimum comeback size)", min_value=MIN_POINTS, max_value=35)
+deficit = st.slider("Hope level (minimum comeback size)", min_value=MIN_POINTS, max_value=MAX_POINTS)
 game_time = st.slider("Clutch level (game time, seconds elapsed)", min_value=0, max_value=GAME_SECONDS)
 st.markdown(f"Game clock: **{get_game_time_str(game_time)}**")
 
-deficit_df = df[(df["max_future_deficit"] >= deficit) & (df["deficit_end_seconds"] >= game_time)]
-if not include_postseason:
-    deficit_df = deficit_df[deficit_df["season_type"] == "REG"]
-
-n_games = len(deficit_df["game_id"].unique())
-rate = n_games / N_SEASONS
+comeback_counts = get_comeback_counts(data_version)
+n_games = comeback_counts.count_games(deficit, game_time, include_postseason)
+rate = get_comeback_rate(n_games, N_SEASONS)
 st.markdown(f"**Comeback level:** {get_comeback_level(rate)} (**{rate}** comebacks/season)")
 
 with st.expander("Advanced filters"):
     min_year, max_year = st.slider("Seasons", min_value=MIN_YEAR, max_value=MAX_YEAR, value=(MIN_YEAR, MAX_YEAR))
     max_wp = st.slider("Maximum win probability", min_value=0., max_value=0.3, value=0.3)
-    deficit_df = deficit_df[(deficit_df["year"] >= min_year) & (deficit_df["year"] <= max_year) & (deficit_df["score_team_wp_at_deficit"] <= max_wp)]
-    post_n_games = len(deficit_df["game_id"].unique())
+    post_n_games = comeback_counts.count_games(deficit, game_time, include_postseason, min_year, max_year, max_wp)
     st.markdown(f"{post_n_games}/{n_games} games under consideration")
 
 st.divider()
@@ -164,50 +261,7 @@ colorby = st.radio(
     ["Deficit", "Win probability"],
 )
 
-fig_dict = dict(
-    x="deficit_end_seconds",
-    y="max_future_deficit",
-    custom_data=[
-        "game_id",
-        "deficit_end_qtr",
-        "deficit_end",
-        "game_date",
-        "week",
-        "deficit_posteam_score",
-        "deficit_defteam_score",
-        "winning_team",
-        "losing_team",
-        "winning_score",
-        "losing_score",
-        "score_team_wp_at_deficit",
-    ],
-)
-
-fig = px.scatter(
-    deficit_df,
-    **get_color(colorby),
-    **fig_dict,
-)
-
-fig.update_layout(
-    title=f"NFL Comebacks by more than two scores ({MIN_POINTS}+ pts.), 1999-2023",
-    xaxis_title="Game time",
-    yaxis_title="Winning team maximum deficit",
-    xaxis=dict(
-        tickmode='array',
-        tickvals=list(range(0, GAME_SECONDS + 1, QUARTER_SECONDS // 3)),
-        ticktext=['Q1 15:00', 'Q1 10:00', 'Q1 5:00', 'Q2 15:00', 'Q2 10:00', 'Q2 5:00', 'Q3 15:00', 'Q3 10:00', 'Q3 5:00', 'Q4 15:00', 'Q4 10:00', 'Q4 5:00', 'End. Reg']
-    ),
-    coloraxis_colorbar=dict(title=colorby),
-)
-fig.update_traces(hovertemplate=get_hovertemplate())
-for i in range(QUARTER_SECONDS, GAME_SECONDS + 1, QUARTER_SECONDS):
-    fig.add_vline(i, line_dash="dash", line_color="white")
-fig.update_xaxes(
-    range=(game_time, GAME_SECONDS),
-    constrain='domain'
-)
-
+fig = get_comeback_figure(data_version, colorby, deficit, game_time, include_postseason, min_year, max_year, max_wp)
 st.plotly_chart(fig, use_container_width=True)
 
 st.markdown("""### Comeback scoring summaries
@@ -218,19 +272,18 @@ To facilitate search, game information is indexed in the following format:
 
 `"[YEAR], Week [WEEK], [HOME_TEAM] vs. [AWAY_TEAM]".`
 """)
-game_mappings, reverse_map = get_game_id_mapping(df.loc[df["max_future_deficit"] >= MIN_POINTS, "game_id"])
+game_mappings, reverse_map = get_game_id_mapping(data_version)
 game_id = st.selectbox(
     "Comebacks",
     game_mappings.values(),
     index=None,
     placeholder="Select a game...",
 )
-scoring_slice = scoring_df.loc[scoring_df["game_id"] == reverse_map.get(game_id, False), SUMMARY_COLS]
 
 if game_id is not None:
-    st.markdown(get_summary_header(scoring_slice))
+    st.markdown(get_summary_header(data_version, reverse_map[game_id]))
     st.table(
-        create_summary(scoring_slice).reset_index(drop=True)
+        create_summary(data_version, reverse_map[game_id]).reset_index(drop=True)
         .style.background_gradient(
             axis=1,
             vmin=DEFICIT_MIN_COLOR,
@@ -240,6 +293,9 @@ if game_id is not None:
         )
     )
 
+if "debug" in st.query_params:
+    st.json({"caches": cache_stats(), "memory": get_memory_footprint(data_version)})
+
 st.markdown("""
 Please direct comments, feedback, or requests to `ctrenton 'at' umich 'dot' edu`.
 
@@ -1,163 +1,52 @@
-import numpy as np
-import pandas as pd
-import plotly.graph_objects as go
+import os
+
 import streamlit as st
 
-from drive_viewer.constants.columns import GAME_COLS, PLAY_COLS
-from drive_viewer.constants.dimensions import DRAW_SCALE, DRIVE_PADDING, PLAY_HEIGHT, TEXT_MARGIN, X_HOME_10YD, X_AWAY_GOAL_LINE, X_NUMBER_SPACING
-from drive_viewer.constants.football import FIELD_COLOR, PLAY_DICT, PLAY_MARKERS
-from drive_viewer.annotate_utils import get_drive_title, get_down_info, get_tooltip_text, yrdln_to_numeric
-from drive_viewer.draw_utils import add_end_zone_text, draw_numbers, fill_end_zone
-
-OFFSET = 10
-
-@st.cache_data
-def get_game_df(week_df, game_id):
-    game_df = week_df.loc[week_df["game_id"] == game_id, GAME_COLS + PLAY_COLS].dropna(
-        subset=["drive", "play_type"]
-    )
-    game_df.loc[:, "yrdln"] = game_df.loc[:, "yrdln"].bfill()
-    return game_df
-
-@st.cache_data
-def get_season_df(season):
-    df = pd.read_csv(f"https://github.com/nflverse/nflverse-data/releases/download/pbp/play_by_play_{season}.csv.gz", low_memory=False)
-    return df
-
-def get_play_starts(drive_df, drive_index, home_team):
-    play_start_series = drive_df["yrdln"].apply(yrdln_to_numeric, home=home_team) + OFFSET
-    return play_start_series, go.Scatter(
-        x=play_start_series,
-        y=drive_index,
-        mode="markers+text",
-        marker=dict(color="orange"),
-        hoverinfo="text",
-        hovertext=get_tooltip_text(drive_df),
-        text=get_down_info(drive_df),
-        textposition="bottom center",
-        textfont_size=14,
-    )
-
-def get_play_ends(drive_df, drive_index, home_team):
-    play_direction_sign = 2 * (drive_df["posteam_type"] == "home") - 1
-    play_end_series = drive_df["yrdln"].apply(yrdln_to_numeric, home=home_team) + play_direction_sign * drive_df["yards_gained"] + OFFSET
-    play_text = drive_df["play_type"].map(PLAY_DICT).tolist()
-    play_text = [str(msg) + "".join([emoji_suffix if drive_df[col].iloc[i] != 0 else "" for col, emoji_suffix in PLAY_MARKERS.items()]) for i, msg in enumerate(play_text)]
-    play_ends = go.Scatter(
-        x=play_end_series,
-        y=drive_index,
-        mode="markers+text",
-        marker=dict(color="blue"),
-        hovertext=get_tooltip_text(drive_df),
-        showlegend=False,
-        hoverinfo="text",
-        text=play_text,
-        textposition="top center",
-        textfont_size=20,
-    )
-    return play_end_series, play_ends
-
-def get_penalty_arrows(drive_df, play_start_series, play_end_series, drive_index):
-    drive_index = np.array(drive_index)
-    play_direction_sign = 2 * (drive_df["posteam_type"].iloc[0] == "home") - 1
-    penalty_mask = (drive_df["penalty"] == 1)
-    penalty_idx = drive_index[penalty_mask]
-    end_penalty = play_end_series.loc[penalty_mask]
-    arrows = [go.layout.Annotation(dict(
-        x=end_penalty.iloc[i] - play_direction_sign * drive_df.loc[penalty_mask, "penalty_yards"].iloc[i],
-        y=penalty_idx[i],
-        xref="x", yref="y",
-        text="",
-        showarrow=True,
-        axref="x",
-        ayref="y",
-        ax=end_penalty.iloc[i],
-        ay=penalty_idx[i],
-        arrowhead=3,
-        arrowwidth=1.5,
-        arrowcolor='yellow',)
-    ) for i in range(len(penalty_idx))]
-    return arrows
-
-
-def get_lines(drive_df, play_start_series, play_end_series, drive_index):
-    return [
-        dict(
-            type="line",
-            x0=play_start_series.iloc[i],
-            y0=drive_index[i],
-            x1=play_end_series.iloc[i],
-            y1=drive_index[i],
-            line=dict(
-                color="black",
-                width=2 if drive_df["play_type"].iloc[i] != "no_play" else 0,
-                dash="dash",
-            ),
-        )
-        for i in range(len(drive_df))
-    ] + [
-        dict(
-            type="line",
-            x0=x,
-            y0=drive_index[0] + DRIVE_PADDING,
-            x1=x,
-            y1=drive_index[-1] - DRIVE_PADDING,
-            line=dict(
-                color="white",
-                width=1,
-            ),
-        )
-        for x in np.arange(X_HOME_10YD, X_AWAY_GOAL_LINE, X_NUMBER_SPACING)
-    ]
-
-def create_drive_chart(drive_no, game_df):
-
-    drive_df = game_df.loc[game_df["drive"] == drive_no, PLAY_COLS]
-    drive_index = PLAY_HEIGHT * np.arange(len(drive_df), 0, -1) + PLAY_HEIGHT
-
-    home_team = game_df["home_team"].iloc[0]
-    away_team = game_df["away_team"].iloc[0]
-    posteam = drive_df["posteam"].iloc[0]
-    posteam_type = drive_df["posteam_type"].iloc[0]
-    side_of_field = drive_df["side_of_field"].iloc[0]
-
-    play_start_series, play_starts = get_play_starts(drive_df, drive_index, home_team)
-    play_end_series, play_ends = get_play_ends(drive_df, drive_index, home_team)
-
-    data = [draw_numbers(drive_index[-1] + TEXT_MARGIN - DRIVE_PADDING / 2), draw_numbers(drive_index[0] + DRIVE_PADDING / 2 - TEXT_MARGIN)] + fill_end_zone(
-        home_team,
-        away_team,
-        [drive_index[-1] - DRIVE_PADDING / 2, drive_index[0] + DRIVE_PADDING / 2],
-    ) + [play_starts, play_ends]
-    lines = get_lines(drive_df, play_start_series, play_end_series, drive_index)
-    arrows = get_penalty_arrows(drive_df, play_start_series, play_end_series, drive_index)
-    layout = go.Layout(
-        autosize=False,
-        width=120 * DRAW_SCALE,
-        height=max(6, len(drive_index)) * PLAY_HEIGHT * DRAW_SCALE,
-        xaxis1=dict(range=[0, 120], autorange=False, tickmode='array', tickvals=np.arange(10, 111, 5).tolist(), showticklabels=False, fixedrange=True),
-        yaxis1=dict(range=[drive_index[-1] - DRIVE_PADDING / 2, drive_index[0] + DRIVE_PADDING / 2], showticklabels=False, showgrid=False, fixedrange=True),
-        plot_bgcolor=FIELD_COLOR,
-        shapes=lines,
-        annotations=arrows,
-        showlegend=False,
-        hoverlabel=dict(
-            bgcolor="white",
-            font_size=14,
-            font_family="Helvetica",
-            font_color="black",
-            align="left",
-        )
-    )
-    fig = go.Figure(data, layout=layout)
-    add_end_zone_text(fig, home_team, away_team, max((drive_index[0] + drive_index[-1]) / 2, 2 * PLAY_HEIGHT))
-    fig.update_traces(
-        marker=dict(
-            size=12,
-            line=dict(width=2, color='DarkSlateGrey')
-        )
-    )
-    return drive_df, fig
+from drive_viewer.annotate_utils import get_play_annotations
+from drive_viewer.constants.columns import PLAY_COLS
+from drive_viewer.drive_chart import create_game_charts, load_exported_chart
+from drive_viewer.drive_index import SeasonIndex
+from drive_viewer.drive_summary import get_summary_labels, load_drive_summaries
+from drive_viewer.season_store import load_season
+from keyed_cache import cache_stats, keyed_cache
+
+RENDER_MODE = "traces"  # see drive_viewer.drive_chart.RENDER_MODES
+# charts pregenerated with `python -m drive_viewer.export_charts` are served from here when present
+CHART_DIR = os.environ.get("DRIVE_CHART_DIR")
+
+@keyed_cache(maxsize=4)
+def get_season_index(season):
+    # built once per season from the local season store (which downloads each season only once); week, game
+    # and drive selections are then slices of its plays. Shared, so do not mutate
+    return SeasonIndex(load_season(season))
+
+@keyed_cache(maxsize=4)
+def get_drive_summaries(season):
+    # plays, yards, time of possession and result of every drive of the season, stored next to the season
+    # after the first time it is selected; rows line up with the season index's drives
+    return load_drive_summaries(season, season_index=get_season_index(season))
+
+def get_drive_labels(season, game_id):
+    # drive labels with each drive's summary, e.g. "(Q1 15:00) Drive 1 (KC): Touchdown, 8 plays, 75 yds, 4:12"
+    season_index = get_season_index(season)
+    _, _, drive_start, drive_end = season_index.games[game_id]
+    return get_summary_labels(get_drive_summaries(season).iloc[drive_start:drive_end], season_index.get_drives(game_id)["label"])
+
+@keyed_cache(maxsize=64)
+def get_game_annotations(season, game_id):
+    # tooltip, down-and-distance and play label strings for every play of the game, indexed like its plays
+    return get_play_annotations(get_season_index(season).get_game(game_id))
+
+@keyed_cache(maxsize=8)
+def get_game_charts(season, game_id):
+    # every drive of the game is charted when the game is selected, so switching drives is a lookup
+    return create_game_charts(get_season_index(season).get_game(game_id), get_game_annotations(season, game_id), RENDER_MODE)
+
+def get_drive_chart(season, game_id, drive_no):
+    fig = None if CHART_DIR is None else load_exported_chart(CHART_DIR, season, game_id, drive_no)
+    if fig is None:
+        return get_game_charts(season, game_id)[drive_no - 1]
+    return get_season_index(season).get_drive(game_id, drive_no)[PLAY_COLS], fig
 
 st.markdown("# NFL Play-by-Play Drive Chart Visualizer")
 st.markdown("""
@@ -167,13 +56,11 @@ st.markdown("""
 season = st.selectbox("Season", range(1999, 2024), index=None, placeholder="Select a season...",)
 
 if season is not None:
-    season_df = get_season_df(season)
-    week = st.selectbox("Week", season_df["week"].unique(), index=None, placeholder="Select a week...")
+    season_index = get_season_index(season)
+    week = st.selectbox("Week", season_index.get_weeks(), index=None, placeholder="Select a week...")
     if week is not None:
-        week_df = season_df.loc[season_df["week"] == week]
-        game_id = st.selectbox("Game ID", week_df["game_id"].unique(), index=None, placeholder="Select a game...")
+        game_id = st.selectbox("Game ID", season_index.get_games(week), index=None, placeholder="Select a game...")
         if game_id is not None:
-            game_df = get_game_df(week_df, game_id)
             _, _, hteam, ateam = game_id.split("_")
             st.markdown("""
             **Legend:**
@@ -184,21 +71,18 @@ if season is not None:
             For best results, view in fullscreen.
 
             """)
-            drive_groups = game_df.groupby("drive")
-            posteams = drive_groups["posteam"].first().tolist()
-            qtrs = drive_groups["qtr"].first().tolist()
-            times = drive_groups["time"].first().tolist()
-            start_times = [f"(Q{qtr} {time})" for qtr, time in zip(qtrs, times)]
-            drive_arr = [f"{time} Drive {i} ({posteam})" for i, posteam, time in zip(range(1, len(game_df["drive"].unique()) + 1), posteams, start_times)]
+            drive_arr = get_drive_labels(season, game_id)
             drive_id = st.selectbox("Drive", drive_arr)
 
-            drive_df, fig = create_drive_chart(drive_arr.index(drive_id) + 1, game_df)
+            drive_df, fig = get_drive_chart(season, game_id, drive_arr.index(drive_id) + 1)
             st.plotly_chart(fig, use_container_width=True)
             st.divider()
             with st.expander("View raw play-by-play data"):
                 st.write(drive_df)
 
 st.divider()
+if "debug" in st.query_params:
+    st.json(cache_stats())
 st.markdown("""
 Please direct comments, feedback, or requests to `ctrenton 'at' umich 'dot' edu`.
 
@@ -0,0 +1,55 @@
+import pytest
+
+import keyed_cache
+from keyed_cache import keyed_cache as cached, set_data_version
+
+@pytest.fixture(autouse=True)
+def reset_data_version():
+    keyed_cache._DATA_VERSION.update(current=None, written=None)
+    yield
+    keyed_cache._DATA_VERSION.update(current=None, written=None)
+
+def make_loader(name):
+    calls = []
+
+    @cached(maxsize=4, versioned=True)
+    def load(data_version):
+        calls.append(data_version)
+        return f"{name}-{data_version}"
+
+    return load, calls
+
+def test_alternating_callers_keep_newer_version():
+    load, calls = make_loader("alternating")
+    load.cache.clear()
+    # two sessions during a re-extract: one read the old stamp, the other the new one
+    old, new = ("v1", 100.0), ("v2", 200.0)
+    for version, written in [old, new, old, new, old]:
+        load(version)
+        set_data_version(version, written)
+
+    assert keyed_cache._DATA_VERSION["current"] == "v2"
+    assert load("v2") == "alternating-v2"
+    # v2 was computed once and never evicted by the session still on v1
+    assert calls.count("v2") == 1
+
+def test_newer_version_prunes_older_entries():
+    load, calls = make_loader("pruning")
+    load.cache.clear()
+    load("v1")
+    set_data_version("v1", 100.0)
+    load("v2")
+    assert set_data_version("v2", 200.0) == 1
+    assert load.cache.stats()["size"] == 1
+    # the older stamp arriving late is ignored
+    assert set_data_version("v1", 100.0) == 0
+    assert keyed_cache._DATA_VERSION["current"] == "v2"
+
+def test_unstamped_versions_still_switch():
+    load, calls = make_loader("unstamped")
+    load.cache.clear()
+    load("v1")
+    set_data_version("v1")
+    load("v2")
+    assert set_data_version("v2") == 1
+    assert set_data_version("v2") == 0